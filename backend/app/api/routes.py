@@ -8,6 +8,7 @@ import asyncio
 import io
 import csv
 import os
+from datetime import datetime
 
 from app.db.session import SessionLocal
 from app.models.models import Project, Domain, Prompt, PromptVersion, Engine, Run, Citation, Reason, Evidence, RunEvent, SubProject, PromptTemplate, Monitor, MonitorTemplate, Insight
@@ -31,9 +32,16 @@ from app.schemas.schemas import (
     EvidenceOut,
     OverviewAnalytics,
 )
-from app.services.tasks import enqueue_run
+from app.services.tasks import PRIORITY_BATCH, PRIORITY_INTERACTIVE, enqueue_run, enqueue_batch, celery as celery_app
 from app.services.kpis import compute_run_report
-from app.services.insights import generate_basic_insights, generate_subproject_insights as svc_generate_subproject_insights
+from app.services.insights import NON_MENTION_CITATIONS, generate_basic_insights, generate_subproject_insights as svc_generate_subproject_insights
+from app.services.adapter_pool import invalidate_adapters, collect_pool_stats
+from app.services.concurrency import collect_concurrency_stats
+from app.services.circuit_breaker import list_circuits
+from app.services.run_control import request_cancel
+from app.services.single_flight import collect_single_flight_stats
+from app.services import domain_matcher
+from app.services.persistence import hydrate_evidence
 import httpx
 from bs4 import BeautifulSoup
 from sqlalchemy.sql import case
@@ -85,10 +93,15 @@ def add_domain(project_id: str, payload: DomainCreate, db: Session = Depends(get
     project = db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projeto não encontrado")
+    if payload.pattern_regex:
+        error = domain_matcher.pattern_error(payload.pattern_regex.strip())
+        if error:
+            raise HTTPException(status_code=400, detail=error)
     domain = Domain(project_id=project_id, domain=payload.domain, pattern_regex=payload.pattern_regex, is_primary=payload.is_primary)
     db.add(domain)
     db.commit()
     db.refresh(domain)
+    domain_matcher.invalidate(project_id)
     return DomainOut(id=domain.id, project_id=project_id, **payload.dict())
 
 
@@ -111,8 +124,10 @@ def delete_domain(domain_id: str, db: Session = Depends(get_db)):
     d = db.get(Domain, domain_id)
     if not d:
         raise HTTPException(status_code=404, detail="Domínio não encontrado")
+    project_id = d.project_id
     db.delete(d)
     db.commit()
+    domain_matcher.invalidate(project_id)
     return {"ok": True}
 
 
@@ -272,8 +287,6 @@ def create_runs(payload: RunCreate, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(run)
 
-        enqueue_run(run.id, cycles=payload.cycles)
-
         created_runs.append(
             RunOut(
                 id=run.id,
@@ -289,6 +302,13 @@ def create_runs(payload: RunCreate, db: Session = Depends(get_db)):
             )
         )
 
+    # Várias engines: um único lote com concorrência limitada por engine
+    if len(created_runs) > 1:
+        enqueue_batch([r.id for r in created_runs], cycles=payload.cycles, priority=PRIORITY_INTERACTIVE)
+    else:
+        for r in created_runs:
+            enqueue_run(r.id, cycles=payload.cycles, priority=PRIORITY_INTERACTIVE)
+
     return created_runs
 
 
@@ -361,7 +381,8 @@ def list_run_evidences(run_id: str, db: Session = Depends(get_db)):
     if not run:
         raise HTTPException(status_code=404, detail="Run não encontrado")
     evs = db.query(Evidence).filter(Evidence.run_id == run_id).all()
-    return [EvidenceOut(id=e.id, run_id=e.run_id, parsed_json=e.parsed_json) for e in evs]
+    # payload bruto reidratado do blob store (o frontend lê parsed_json.raw)
+    return [EvidenceOut(id=e.id, run_id=e.run_id, parsed_json=hydrate_evidence(e)) for e in evs]
 
 
 @api_router.get("/runs", response_model=list[RunListItem])
@@ -585,6 +606,10 @@ def get_run(run_id: str, db: Session = Depends(get_db)):
         tokens_total=run.tokens_total,
         cost_usd=run.cost_usd,
         latency_ms=run.latency_ms,
+        cache_hits=run.cache_hits,
+        single_flight_hits=run.single_flight_hits,
+        sql_statements=run.sql_statements,
+        db_round_trips=run.db_round_trips,
     )
 
 
@@ -605,6 +630,29 @@ def list_run_events(run_id: str, db: Session = Depends(get_db)):
     ]
 
 
+@api_router.post("/runs/{run_id}/cancel")
+def cancel_run(run_id: str, db: Session = Depends(get_db)):
+    """Cancela uma run: na fila, revoga a task e encerra já; em execução, o worker interrompe o fetch em curso."""
+    run = db.get(Run, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run não encontrado")
+    if run.status in ("completed", "failed", "cancelled"):
+        return {"id": run.id, "status": run.status, "cancelled": False}
+    request_cancel(run.id)
+    if run.status == "queued":
+        try:
+            # execute_run usa o id da run como task_id; runs de lote são puladas pelo flag de cancelamento
+            celery_app.control.revoke(run.id)
+        except Exception:
+            pass
+        run.status = "cancelled"
+        run.error_code = "cancelled"
+        run.finished_at = datetime.utcnow()
+        db.add(RunEvent(run_id=run.id, step="cancelled", status="ok", message="Run cancelada na fila"))
+        db.commit()
+    return {"id": run.id, "status": run.status, "cancelled": True}
+
+
 @api_router.post("/runs/{run_id}/link-ai-overview")
 def link_ai_overview(run_id: str, payload: dict = Body(...), db: Session = Depends(get_db)):
     src = db.get(Run, run_id)
@@ -869,7 +917,7 @@ def subproject_top_domains(subproject_id: str, limit: int = 10, db: Session = De
     rows = (
         db.query(Citation.domain, func.count(Citation.id))
         .join(Run, Run.id == Citation.run_id)
-        .filter(Run.subproject_id == subproject_id)
+        .filter(Run.subproject_id == subproject_id, NON_MENTION_CITATIONS)
         .group_by(Citation.domain)
         .order_by(func.count(Citation.id).desc())
         .limit(limit)
@@ -1039,9 +1087,20 @@ def run_monitor_now(monitor_id: str, db: Session = Depends(get_db)):
             db.add(run)
             db.commit()
             db.refresh(run)
-            enqueue_run(run.id, cycles=1)
             created.append(run.id)
-    return {"queued_runs": created}
+    # monitores vão para a fila de lote, sem atrasar runs disparadas pela UI
+    batch_id = enqueue_batch(created, cycles=1, priority=PRIORITY_BATCH) if created else None
+    return {"queued_runs": created, "batch_id": batch_id}
+
+
+@api_router.get("/batches/{batch_id}")
+def get_batch_progress(batch_id: str):
+    """Progresso de um lote enfileirado via execute_batch (estado da task Celery)."""
+    res = celery_app.AsyncResult(batch_id)
+    info = res.info if isinstance(res.info, dict) else {}
+    if res.failed():
+        info = {"error": str(res.info)[:500]}
+    return {"batch_id": batch_id, "state": res.state, **info}
 
 
 @api_router.get("/monitors/{monitor_id}/templates")
@@ -1221,7 +1280,7 @@ def export_subproject_csv(subproject_id: str, db: Session = Depends(get_db)):
     cits = (
         db.query(Citation.run_id, Citation.url)
         .join(Run, Run.id == Citation.run_id)
-        .filter(Run.subproject_id == subproject_id)
+        .filter(Run.subproject_id == subproject_id, NON_MENTION_CITATIONS)
         .all()
     )
     run_to_urls: dict[str, list[str]] = {}
@@ -1282,7 +1341,7 @@ def generate_subproject_insights(subproject_id: str, db: Session = Depends(get_d
     citations = (
         db.query(Citation.run_id, Citation.domain, Citation.url)
         .join(Run, Run.id == Citation.run_id)
-        .filter(Run.subproject_id == subproject_id)
+        .filter(Run.subproject_id == subproject_id, NON_MENTION_CITATIONS)
         .limit(1000)
         .all()
     )
@@ -1652,11 +1711,7 @@ def generate_subproject_insights(subproject_id: str, db: Session = Depends(get_d
                 if r.get("project_id"):
                     project_id = r["project_id"]
                     break
-            project_domains = set()
-            if project_id:
-                for d in db.query(Domain).filter(Domain.project_id == project_id).all():
-                    if d.domain:
-                        project_domains.add(d.domain)
+            matcher = domain_matcher.for_project(db, project_id) if project_id else None
 
             # top domains e tokens
             dom_counter = Counter()
@@ -1688,7 +1743,7 @@ def generate_subproject_insights(subproject_id: str, db: Session = Depends(get_d
             top_wc = [{"token": t, "weight": float(c)} for t, c in token_counter.most_common(20)]
             top_competitor = None
             for d, _c in dom_counter.most_common():
-                if d not in project_domains:
+                if matcher is None or not matcher.matches(d):
                     top_competitor = d
                     break
 
@@ -1778,7 +1833,7 @@ def setup_status() -> dict:
 
 @api_router.post("/setup/save-keys")
 def save_keys(payload: dict = Body(...)) -> dict:
-    """Persiste chaves em .env e atualiza o ambiente do processo para efeito imediato."""
+    """Persiste chaves em .env e atualiza o ambiente do processo e dos workers para efeito imediato."""
     # Map de campos -> variáveis aceitas
     key_map: dict[str, list[str]] = {
         "openai_key": ["OPENAI_API_KEY"],
@@ -1849,9 +1904,38 @@ def save_keys(payload: dict = Body(...)) -> dict:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao salvar .env: {str(e)[:200]}")
 
+    # Chaves mudaram: descartar adapters/clientes cacheados (processo atual e workers, que
+    # recebem as chaves novas pelo Redis)
+    if saved_vars:
+        invalidate_adapters(credentials={var: os.environ[var] for var in saved_vars})
+
     return {"ok": True, "saved": saved_vars}
 
 
+@api_router.get("/runtime/adapters")
+def runtime_adapter_stats() -> dict:
+    """Estatísticas do pool de adapters publicadas por cada processo de worker."""
+    return {"workers": collect_pool_stats()}
+
+
+@api_router.get("/runtime/concurrency")
+def runtime_concurrency() -> dict:
+    """Alvo atual de chamadas simultâneas por engine (controle AIMD), somado entre workers."""
+    return collect_concurrency_stats()
+
+
+@api_router.get("/runtime/single-flight")
+def runtime_single_flight() -> dict:
+    """Chamadas idênticas coalescidas: buscas reais (leaders) vs. reaproveitadas (local/remote hits)."""
+    return collect_single_flight_stats()
+
+
+@api_router.get("/runtime/circuits")
+def runtime_circuits() -> dict:
+    """Estado dos circuit breakers por engine/modelo (closed/open/half_open)."""
+    return {"circuits": list_circuits()}
+
+
 @api_router.post("/setup/test-connections")
 def test_connections(payload: dict = Body(...)) -> dict:
     results = {}
@@ -1945,7 +2029,7 @@ def smoke_test(payload: dict = Body(...), db: Session = Depends(get_db)) -> dict
             db.add(engine); db.commit(); db.refresh(engine)
         run = Run(project_id=project_id, prompt_version_id=pv.id, engine_id=engine.id, subproject_id=subproject_id, status="queued")
         db.add(run); db.commit(); db.refresh(run)
-        enqueue_run(run.id, cycles=1)
+        enqueue_run(run.id, cycles=1, priority=PRIORITY_INTERACTIVE)
         queued.append(run.id)
     return {"queued_runs": queued}
 
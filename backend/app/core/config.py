@@ -12,6 +12,129 @@ class Settings(BaseSettings):
     perplexity_api_key: str | None = None
     serpapi_key: str | None = None
 
+    # Execução de runs
+    # Máximo de ciclos de uma mesma run buscados em paralelo (1 = sequencial).
+    # Pode ser sobrescrito por Engine.config_json["cycle_concurrency"].
+    run_cycle_concurrency: int = 1
+    # Filas Celery por classe de prioridade: runs disparadas pela UI (interactive) não esperam
+    # atrás de lotes de monitores (batch). Workers dedicados: `-Q runs` / `-Q runs_batch`.
+    queue_interactive: str = "runs"
+    queue_batch: str = "runs_batch"
+    # RunEvents são gravados em lote: flush após N segundos ou N eventos acumulados
+    # (além das fronteiras de etapa: antes do fetch e ao concluir/falhar a run).
+    run_events_flush_seconds: float = 0.5
+    run_events_max_buffer: int = 200
+    # Chamadas simultâneas por engine dentro de um lote (tasks.execute_batch).
+    # Pode ser sobrescrito por Engine.config_json["max_concurrency"].
+    engine_concurrency: dict[str, int] = {
+        "openai": 8,
+        "gemini": 8,
+        "perplexity": 4,
+        "google_serp": 2,
+        "sandbox": 16,
+    }
+    engine_concurrency_default: int = 4
+
+    # Cliente HTTP compartilhado dos adapters (Perplexity, SerpAPI)
+    http_timeout_seconds: float = 30.0
+    http_connect_timeout_seconds: float = 10.0
+    http_pool_timeout_seconds: float = 30.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http2_enabled: bool = True
+
+    # Rate limit distribuído (token bucket no Redis) por provider/modelo/chave.
+    # Chaves "provider" ou "provider:modelo"; valores {rpm, tpm} (0/ausente = sem limite).
+    # Engine.config_json["rate_limit"] sobrescreve por engine.
+    rate_limit_enabled: bool = True
+    rate_limit_max_wait_seconds: float = 120.0
+    rate_limits: dict[str, dict[str, int]] = {
+        "openai": {"rpm": 500, "tpm": 200000},
+        "gemini": {"rpm": 300, "tpm": 1000000},
+        "perplexity": {"rpm": 50},
+        "serpapi": {"rpm": 100},
+        "google_html": {"rpm": 20},
+    }
+
+    # Concorrência adaptativa (AIMD) por engine, limitada pelo teto fixo engine_concurrency
+    aimd_enabled: bool = True
+    aimd_min_limit: int = 1
+    aimd_increase: float = 1.0
+    aimd_backoff: float = 0.5
+    # latência acima de N× a média recente não conta como saudável (não aumenta o alvo)
+    aimd_latency_factor: float = 2.0
+    aimd_cooldown_seconds: float = 5.0
+
+    # Circuit breaker por engine/modelo (estado no Redis, compartilhado entre workers)
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_failure_threshold: int = 5
+    circuit_breaker_window_seconds: float = 60.0
+    circuit_breaker_open_seconds: float = 30.0
+    circuit_breaker_probe_timeout_seconds: float = 120.0
+    # "requeue": reenfileira a run com atraso; "fail": encerra com error_code=circuit_open.
+    # Pode ser sobrescrito por Engine.config_json["circuit_open_action"].
+    circuit_breaker_action: str = "requeue"
+    circuit_breaker_max_requeues: int = 5
+
+    # Cache de respostas dos providers (Redis), chave = hash canônico do fetch efetivo.
+    # Desligar por engine com config_json["cache"]=false ou ajustar config_json["cache_ttl_seconds"].
+    response_cache_enabled: bool = True
+    response_cache_ttl: dict[str, int] = {
+        "openai": 900,
+        "gemini": 900,
+        "perplexity": 900,
+        "google_serp": 600,
+        "sandbox": 3600,
+    }
+    response_cache_ttl_default: int = 600
+    # Redis próprio do cache (instância ou DB separado, com política de descarte própria): o Redis
+    # principal é broker do Celery e guarda breaker/limiter/cancelamento, e não pode descartar chaves.
+    # Vazio = usa redis_url.
+    response_cache_redis_url: str | None = None
+    # entradas comprimidas maiores que isso não são cacheadas
+    response_cache_max_entry_bytes: int = 2_000_000
+
+    # Single-flight: chamadas idênticas simultâneas (mesmo hash de fetch) viram um único fetch.
+    # Independe do cache; desligar por engine com config_json["single_flight"]=false.
+    single_flight_enabled: bool = True
+    # lease do lock do líder (deve cobrir um fetch lento) e quanto os demais aguardam
+    single_flight_lease_seconds: float = 180.0
+    single_flight_wait_seconds: float = 180.0
+    # por quanto tempo o resultado do líder fica disponível para quem ainda está aguardando
+    single_flight_result_ttl_seconds: int = 30
+
+    # Hedge (opt-in por engine via config_json["hedge"]): pedido duplicado quando a resposta
+    # passa do percentil da latência histórica da engine. Só para runs interativas.
+    hedge_percentile: float = 95.0
+    hedge_min_samples: int = 20
+    hedge_min_delay_seconds: float = 2.0
+    hedge_history_size: int = 200
+
+    # Prazo total de uma run (todos os ciclos), propagado aos adapters via fetch_input["deadline"].
+    # Por engine: settings.run_deadlines[engine] ou Engine.config_json["deadline_seconds"].
+    run_deadline_seconds: float = 900.0
+    run_deadlines: dict[str, float] = {"google_serp": 300.0, "sandbox": 60.0}
+
+    # Chromium compartilhado por worker (SERP via Playwright)
+    browser_max_contexts: int = 4
+    browser_restart_after_pages: int = 200
+
+    # Resolução dos redirects de grounding (vertexaisearch) em lote: concorrência por resposta,
+    # timeout por link e TTL do cache no Redis (o destino de um link de grounding não muda)
+    redirect_resolve_concurrency: int = 8
+    redirect_resolve_timeout_seconds: float = 8.0
+    redirect_cache_ttl_seconds: int = 30 * 24 * 3600
+
+    # Payloads brutos das evidências (resposta completa do provider / HTML) ficam fora do Postgres,
+    # em um blob store endereçado por conteúdo (sha256): "local" (diretório) ou "s3" (requer boto3).
+    # Compressão zstd quando o pacote zstandard estiver instalado, senão gzip.
+    blob_store_backend: str = "local"
+    blob_store_path: str = "/data/blobs"
+    blob_store_s3_bucket: str | None = None
+    blob_store_s3_prefix: str = "evidence/"
+    blob_store_s3_endpoint_url: str | None = None
+
     # Permitir variáveis extras do .env (ex.: SERPAPI_KEY, OPENAI_API_KEY)
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """Contagem de statements SQL e idas ao banco (statements + commits/rollbacks)."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.round_trips = 0
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries(counter: QueryCounter | None = None) -> Iterator[QueryCounter]:
+    """Ativa `counter` no contexto atual; todo SQL executado dentro do bloco é contabilizado nele."""
+    counter = counter or QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def _on_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    counter = _current.get()
+    if counter is not None:
+        counter.statements += 1
+        counter.round_trips += 1
+
+
+def _on_transaction_end(conn: Any) -> None:
+    counter = _current.get()
+    if counter is not None:
+        counter.round_trips += 1
+
+
+def install(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _on_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    event.listen(engine, "commit", _on_transaction_end)
+    event.listen(engine, "rollback", _on_transaction_end)
@@ -2,6 +2,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db import query_stats
 
 engine = create_engine(settings.database_url, pool_pre_ping=True)
+query_stats.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
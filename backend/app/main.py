@@ -38,6 +38,12 @@ def on_startup() -> None:
                 "ALTER TABLE runs ADD COLUMN IF NOT EXISTS model_name VARCHAR(255)",
                 "ALTER TABLE runs ADD COLUMN IF NOT EXISTS error_code VARCHAR(255)",
                 "ALTER TABLE runs ADD COLUMN IF NOT EXISTS config_hash VARCHAR(255)",
+                "ALTER TABLE runs ADD COLUMN IF NOT EXISTS cache_hits INTEGER",
+                "ALTER TABLE runs ADD COLUMN IF NOT EXISTS single_flight_hits INTEGER",
+                "ALTER TABLE runs ADD COLUMN IF NOT EXISTS sql_statements INTEGER",
+                "ALTER TABLE runs ADD COLUMN IF NOT EXISTS db_round_trips INTEGER",
+                "ALTER TABLE citations ADD COLUMN IF NOT EXISTS url_normalized VARCHAR",
+                "ALTER TABLE evidences ADD COLUMN IF NOT EXISTS content_size INTEGER",
                 # insights.run_id para relacionar insight com run
                 "ALTER TABLE insights ADD COLUMN IF NOT EXISTS run_id VARCHAR(255)",
                 "DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM information_schema.constraint_column_usage WHERE table_name='insights' AND column_name='run_id') THEN BEGIN EXCEPTION WHEN others THEN END; END IF; END $$;",
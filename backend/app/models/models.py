@@ -128,6 +128,13 @@ class Run(Base):
     model_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     error_code: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     config_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Ciclos atendidos pelo cache de respostas (ver services/response_cache)
+    cache_hits: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Ciclos que reaproveitaram uma chamada idêntica em andamento (single-flight)
+    single_flight_hits: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Custo de banco da execução (statements SQL e idas ao banco contadas pelo worker)
+    sql_statements: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    db_round_trips: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
 
 class Evidence(Base):
@@ -138,7 +145,9 @@ class Evidence(Base):
     raw_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     parsed_json: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     screenshot_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # sha256 do payload bruto no blob store (parsed_json guarda só o resumo) e tamanho do JSON em bytes
     content_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    content_size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
 
 class Citation(Base):
@@ -148,8 +157,10 @@ class Citation(Base):
     run_id: Mapped[str] = mapped_column(ForeignKey("runs.id", ondelete="CASCADE"))
     domain: Mapped[str] = mapped_column(String)
     url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # URL canônica (dedupe) calculada na ingestão; NULL em linhas antigas
+    url_normalized: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     anchor: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    position: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # top|middle|bottom
+    position: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # top|middle|bottom; menções: "início-fim"
     type: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # link|mention|logo
     is_ours: Mapped[bool] = mapped_column(Boolean, default=False)
 
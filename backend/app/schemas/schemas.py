@@ -126,6 +126,10 @@ class RunDetailOut(BaseModel):
     tokens_total: Optional[int] = None
     cost_usd: Optional[float] = None
     latency_ms: Optional[int] = None
+    cache_hits: Optional[int] = None
+    single_flight_hits: Optional[int] = None
+    sql_statements: Optional[int] = None
+    db_round_trips: Optional[int] = None
 
 
 class CitationOut(BaseModel):
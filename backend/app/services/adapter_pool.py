@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.services.redis_client import get_async_redis, get_redis, key
+from app.services.runtime import runtime
+
+
+# Variáveis de ambiente que determinam o cliente de cada engine; mudou a chave → novo adapter
+CREDENTIAL_ENV: Dict[str, Tuple[str, ...]] = {
+    "openai": ("OPENAI_API_KEY", "OPENAI_MODEL"),
+    "gemini": ("GOOGLE_API_KEY", "GEMINI_API_KEY", "GEMINI_MODEL"),
+    "perplexity": ("PERPLEXITY_API_KEY",),
+    "google_serp": ("SERPAPI_KEY",),
+    "sandbox": (),
+}
+
+GENERATION_KEY = key("adapters", "generation")
+# Chaves salvas por /setup/save-keys (var -> valor); os workers aplicam no próprio ambiente
+CREDENTIALS_KEY = key("adapters", "credentials")
+STATS_KEY_PATTERN = key("adapters", "stats", "*")
+# Frequência com que cada processo confere a geração global e publica estatísticas
+SYNC_INTERVAL_SECONDS = 5.0
+STATS_TTL_SECONDS = 120
+
+
+def _apply_credentials(raw: Dict[Any, Any]) -> None:
+    # só variáveis conhecidas de CREDENTIAL_ENV; o fingerprint muda e o adapter é recriado
+    allowed = {var for env in CREDENTIAL_ENV.values() for var in env}
+    for var, value in raw.items():
+        var = var.decode() if isinstance(var, bytes) else str(var)
+        if var in allowed:
+            os.environ[var] = value.decode() if isinstance(value, bytes) else str(value)
+
+
+def credentials_fingerprint(engine: str) -> str:
+    values = [os.getenv(var) or "" for var in CREDENTIAL_ENV.get(engine, ())]
+    return hashlib.sha256("\x1f".join(values).encode("utf-8")).hexdigest()[:12]
+
+
+class AdapterPool:
+    """Registro de adapters por processo, indexado por (engine, credenciais).
+
+    Adapters (e seus clientes SDK/HTTP) são reutilizados entre ciclos e runs do mesmo worker.
+    A invalidação é local (`invalidate`) ou global via contador de geração no Redis,
+    incrementado por `/setup/save-keys` e conferido a cada SYNC_INTERVAL_SECONDS; junto com a
+    geração, as chaves salvas ficam em CREDENTIALS_KEY e cada processo as aplica ao próprio
+    `os.environ` antes de recriar os adapters (o ambiente dos workers não vê o .env da API).
+    Adapters descartados com chamadas em andamento (`lease`) só são fechados quando a última
+    chamada termina.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pid = os.getpid()
+        self._generation: int | None = None
+        self._last_sync = 0.0
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._hook_registered = False
+        # chamadas em andamento por adapter e adapters descartados aguardando ficarem ociosos
+        self._active: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self._sync_task: Any = None
+
+    def _reset_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            self._entries = {}
+            self._pid = os.getpid()
+            self._generation = None
+            self._last_sync = 0.0
+            self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+            self._hook_registered = False
+            self._active = {}
+            self._retired = {}
+            self._sync_task = None
+
+    def get(self, engine: str, factory: Callable[[], Any]) -> Any:
+        self._reset_after_fork()
+        self._maybe_sync()
+        entry_key = (engine, credentials_fingerprint(engine))
+        to_close: List[Any] = []
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self._counters["misses"] += 1
+                # credenciais antigas da mesma engine não serão mais usadas
+                stale = [k for k in self._entries if k[0] == engine]
+                for k in stale:
+                    to_close.extend(self._retire(self._entries.pop(k)["adapter"]))
+                entry = {"adapter": factory(), "created_at": time.time(), "uses": 0}
+                self._entries[entry_key] = entry
+            else:
+                self._counters["hits"] += 1
+            entry["uses"] += 1
+            entry["last_used"] = time.time()
+            adapter = entry["adapter"]
+        for stale_adapter in to_close:
+            self._close(stale_adapter)
+        if not self._hook_registered:
+            runtime.add_shutdown_hook(self.aclose_all)
+            self._hook_registered = True
+        return adapter
+
+    @contextmanager
+    def lease(self, engine: str, factory: Callable[[], Any]) -> Iterator[Any]:
+        """Adapter em uso durante o bloco: se for descartado nesse meio tempo, só fecha ao final."""
+        adapter = self.get(engine, factory)
+        ident = id(adapter)
+        with self._lock:
+            self._active[ident] = self._active.get(ident, 0) + 1
+        try:
+            yield adapter
+        finally:
+            idle: Optional[Any] = None
+            with self._lock:
+                remaining = self._active.get(ident, 1) - 1
+                if remaining > 0:
+                    self._active[ident] = remaining
+                else:
+                    self._active.pop(ident, None)
+                    idle = self._retired.pop(ident, None)
+            if idle is not None:
+                self._close(idle)
+
+    def _retire(self, adapter: Any) -> List[Any]:
+        # chamado com o lock: adapter em uso fica para o fim da última chamada (lease)
+        if self._active.get(id(adapter)):
+            self._retired[id(adapter)] = adapter
+            return []
+        return [adapter]
+
+    def invalidate(self) -> int:
+        to_close: List[Any] = []
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries = {}
+            self._counters["invalidations"] += 1
+            for entry in entries:
+                to_close.extend(self._retire(entry["adapter"]))
+        for adapter in to_close:
+            self._close(adapter)
+        return len(entries)
+
+    def _close(self, adapter: Any) -> None:
+        aclose = getattr(adapter, "aclose", None)
+        if aclose is None or not runtime.is_running():
+            return
+        try:
+            if runtime.in_runtime_thread():
+                runtime.loop.create_task(aclose())
+            else:
+                runtime.submit(aclose())
+        except Exception:
+            pass
+
+    async def aclose_all(self) -> None:
+        with self._lock:
+            adapters = [e["adapter"] for e in self._entries.values()] + list(self._retired.values())
+            self._entries = {}
+            self._retired = {}
+        for adapter in adapters:
+            aclose = getattr(adapter, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            entries = [
+                {
+                    "engine": engine,
+                    "credentials": fingerprint,
+                    "uses": e["uses"],
+                    "age_seconds": int(now - e["created_at"]),
+                    "idle_seconds": int(now - e.get("last_used", e["created_at"])),
+                }
+                for (engine, fingerprint), e in self._entries.items()
+            ]
+            counters = dict(self._counters)
+        stats: Dict[str, Any] = {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "generation": self._generation,
+            "adapters": entries,
+            **counters,
+        }
+        for extra in _stats_providers:
+            try:
+                stats.update(extra())
+            except Exception:
+                pass
+        return stats
+
+    def _stats_key(self) -> str:
+        return key("adapters", "stats", f"{socket.gethostname()}-{os.getpid()}")
+
+    def _apply_generation(self, generation: int, credentials: Optional[Dict[Any, Any]]) -> None:
+        if credentials:
+            _apply_credentials(credentials)
+        if self._generation is not None and generation != self._generation:
+            self.invalidate()
+        self._generation = generation
+
+    def _maybe_sync(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sync < SYNC_INTERVAL_SECONDS:
+            return
+        self._last_sync = now
+        if runtime.in_runtime_thread():
+            # dentro do loop do worker: nada de Redis síncrono; a conferência roda em background
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = runtime.loop.create_task(self._sync_async())
+            return
+        try:
+            r = get_redis()
+            generation = int(r.get(GENERATION_KEY) or 0)
+            # credenciais só na primeira conferência ou quando a geração mudou
+            credentials = r.hgetall(CREDENTIALS_KEY) if generation != self._generation else None
+            self._apply_generation(generation, credentials)
+            r.set(self._stats_key(), json.dumps(self.stats()), ex=STATS_TTL_SECONDS)
+        except Exception:
+            # Redis indisponível: manter adapters atuais
+            pass
+
+    async def _sync_async(self) -> None:
+        try:
+            r = get_async_redis()
+            generation = int(await r.get(GENERATION_KEY) or 0)
+            credentials = await r.hgetall(CREDENTIALS_KEY) if generation != self._generation else None
+            self._apply_generation(generation, credentials)
+            await r.set(self._stats_key(), json.dumps(self.stats()), ex=STATS_TTL_SECONDS)
+        except Exception:
+            pass
+
+
+# Funções extras que contribuem para as estatísticas (ex.: pool HTTP compartilhado)
+_stats_providers: List[Callable[[], Dict[str, Any]]] = []
+
+pool = AdapterPool()
+
+
+def register_stats_provider(fn: Callable[[], Dict[str, Any]]) -> None:
+    _stats_providers.append(fn)
+
+
+def invalidate_adapters(broadcast: bool = True, credentials: Optional[Dict[str, str]] = None) -> int:
+    """Descarta os adapters do processo e, com `broadcast`, sinaliza todos os workers via Redis.
+
+    `credentials` (var -> valor) são publicadas junto com a nova geração, na mesma transação,
+    para que os workers recriem os adapters com as chaves novas.
+    """
+    dropped = pool.invalidate()
+    if broadcast:
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            if credentials:
+                pipe.hset(CREDENTIALS_KEY, mapping=credentials)
+            pipe.incr(GENERATION_KEY)
+            pipe.execute()
+        except Exception:
+            pass
+    return dropped
+
+
+def collect_pool_stats() -> List[Dict[str, Any]]:
+    """Estatísticas publicadas pelos processos de worker (últimos STATS_TTL_SECONDS)."""
+    out: List[Dict[str, Any]] = []
+    try:
+        r = get_redis()
+        for k in r.scan_iter(match=STATS_KEY_PATTERN, count=100):
+            raw = r.get(k)
+            if raw:
+                out.append(json.loads(raw))
+    except Exception:
+        pass
+    return out
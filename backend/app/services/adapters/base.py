@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Protocol, TypedDict, List
+from typing import NotRequired, Protocol, TypedDict, List
 
 
 class FetchInput(TypedDict):
@@ -9,6 +9,11 @@ class FetchInput(TypedDict):
     region: str
     device: str
     config: dict
+    # preenchidos pelo worker: run de origem, prazo (segundos e absoluto, epoch) e classe de prioridade
+    run_id: NotRequired[str]
+    deadline_seconds: NotRequired[float]
+    deadline: NotRequired[float]
+    priority: NotRequired[str]
 
 
 class RawEvidence(TypedDict):
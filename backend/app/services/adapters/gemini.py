@@ -9,7 +9,7 @@ from google import genai
 from google.genai import types
 
 from app.services.adapters.base import EngineAdapter, FetchInput, RawEvidence, ParsedAnswer, Citation
-from app.services.normalization import resolve_known_redirects
+from app.services import rate_limit, redirects
 
 
 SUPPORTED_MODELS = {
@@ -32,6 +32,12 @@ class GeminiAdapter:
         self.default_model = model or os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
         self.client: Optional[genai.Client] = genai.Client(api_key=self.api_key) if self.api_key else None
 
+    async def aclose(self) -> None:
+        # `aclose` só existe em versões mais novas do SDK
+        aclose = getattr(getattr(self.client, "aio", None), "aclose", None)
+        if aclose is not None:
+            await aclose()
+
     def _resolve_model(self, cfg: dict | None) -> str:
         cfg_model = (cfg or {}).get("model")
         model = (cfg_model or self.default_model).strip()
@@ -98,7 +104,9 @@ class GeminiAdapter:
                 else:
                     config = types.GenerateContentConfig()
 
-                resp = self.client.models.generate_content(
+                await rate_limit.acquire("gemini", model_name, self.api_key, cfg, rate_limit.estimate_tokens(prompt, cfg.get("max_output_tokens") or 2048))
+                # Superfície async do SDK (client.aio) para não bloquear o event loop
+                resp = await self.client.aio.models.generate_content(
                     model=model_name,
                     contents=prompt,
                     config=config,
@@ -116,7 +124,8 @@ class GeminiAdapter:
                     has_text = bool(data.get("text"))
                 if not has_text:
                     try:
-                        resp2 = self.client.models.generate_content(
+                        await rate_limit.acquire("gemini", model_name, self.api_key, cfg, rate_limit.estimate_tokens(None, cfg.get("max_output_tokens") or 2048))
+                        resp2 = await self.client.aio.models.generate_content(
                             model=model_name,
                             contents="Forneça a resposta final agora em texto corrido com 3–5 fontes (URLs completas http) no final.",
                             config=config,
@@ -177,7 +186,7 @@ class GeminiAdapter:
             text = data.get("text") or ""
 
         # --- Extract links from groundingMetadata (preferred) and citationMetadata (fallback) ---
-        links: List[Dict[str, str]] = []
+        found: List[Dict[str, Any]] = []
         try:
             cand0 = (data.get("candidates") or [{}])[0]
             gm = cand0.get("groundingMetadata", {}) or cand0.get("grounding_metadata", {})
@@ -186,25 +195,27 @@ class GeminiAdapter:
                 web = ch.get("web") or {}
                 uri = web.get("uri") or web.get("url")
                 if uri:
-                    uri = resolve_known_redirects(uri)
-                    links.append({"url": uri, "title": web.get("title")})
+                    found.append({"url": uri, "title": web.get("title")})
             # Legacy: citationMetadata
             cite = cand0.get("citationMetadata", {}) or cand0.get("citation_metadata", {})
             for part in cite.get("citationSources", []) + cite.get("citations", []):
                 uri = part.get("uri") or part.get("url")
                 if uri:
-                    uri = resolve_known_redirects(uri)
-                    links.append({"url": uri, "title": part.get("title")})
+                    found.append({"url": uri, "title": part.get("title")})
         except Exception:
             pass
+        text_urls = URL_RE.findall(text) if text else []
+
+        # redirects (grounding do vertexaisearch) resolvidos todos de uma vez, com cache
+        resolved = await redirects.resolve_many([l["url"] for l in found] + text_urls)
+        links: List[Dict[str, str]] = [{"url": resolved.get(l["url"], l["url"]), "title": l["title"]} for l in found]
 
         # Fallback: scrape URLs from text
-        if text:
-            have = {l["url"] for l in links}
-            for m in URL_RE.findall(text):
-                m2 = resolve_known_redirects(m)
-                if m2 not in have:
-                    links.append({"url": m2, "title": None})
+        have = {l["url"] for l in links}
+        for m in text_urls:
+            m2 = resolved.get(m, m)
+            if m2 not in have:
+                links.append({"url": m2, "title": None})
 
         # --- Inferir uso de web search e contagem de chamadas ---
         web_used = False
@@ -1,15 +1,44 @@
 from __future__ import annotations
 
 import os
-from typing import List
+from typing import Any, Dict, List, Tuple
 from urllib.parse import urlencode, parse_qs, urlparse
 
-import httpx
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
 
 from app.services.adapters.base import EngineAdapter, FetchInput, RawEvidence, ParsedAnswer, Citation
-from app.services.normalization import resolve_known_redirects
+from app.services.http_client import get_http_client
+from app.services import rate_limit, redirects, run_control
+from app.services.browser_pool import pool as browser_pool
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+
+RESULTS_SELECTOR = "#search, #rso"
+AI_OVERVIEW_SELECTOR = "#search [data-subtree='aimc'], #search [jsname][data-mcpr], #search div[data-attrid='SGEAnswer']"
+
+# Recursos que não influenciam o HTML dos resultados: bloqueados na rede
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google.com",
+)
+
+
+async def _block_heavy_requests(route) -> None:
+    request = route.request
+    host = urlparse(request.url).netloc.lower()
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(host == t or host.endswith("." + t) for t in TRACKER_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 BLOCKED_HOSTS = {
@@ -43,35 +72,34 @@ class GoogleSerpAdapter:
             except Exception:
                 continue
 
-    async def _fetch_with_playwright(self, query: str, language: str) -> RawEvidence:
+    async def _fetch_with_playwright(self, query: str, language: str, deadline_left: float | None = None) -> RawEvidence:
+        # SERP HTML direto: limitar a taxa evita bloqueios/captcha do Google
+        await rate_limit.acquire("google_html")
         params = {"q": query, "hl": language or "pt-BR", "gl": "BR", "pws": "0", "num": "10"}
         url = f"https://www.google.com/search?{urlencode(params)}"
         html = ""
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True, args=["--no-sandbox", "--disable-dev-shm-usage"])  # noqa
-            context = await browser.new_context(
-                user_agent=(
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-                ),
-                locale=language or "pt-BR",
-            )
-            page = await context.new_page()
-            await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+        # browser compartilhado do worker; contexto novo (sem cookies/estado) a cada consulta
+        async with browser_pool.page(user_agent=USER_AGENT, locale=language or "pt-BR") as page:
+            await page.route("**/*", _block_heavy_requests)
+            # navegação limitada ao prazo restante da run
+            goto_timeout = 60000 if deadline_left is None else max(1000, min(60000, int(deadline_left * 1000)))
+            await page.goto(url, timeout=goto_timeout, wait_until="domcontentloaded")
             await self._try_accept_consent(page)
             try:
-                await page.wait_for_selector("#search", timeout=20000)
+                await page.wait_for_selector(RESULTS_SELECTOR, timeout=20000)
             except Exception:
                 pass
-            # rolagem incremental
+            # AI Overview é preenchido depois dos resultados: esperar o texto aparecer, se houver o bloco
             try:
-                for _ in range(3):
-                    await page.evaluate("window.scrollBy(0, document.body.scrollHeight/2)")
-                    await page.wait_for_timeout(800)
+                overview = await page.query_selector(AI_OVERVIEW_SELECTOR)
+                if overview is not None:
+                    await page.wait_for_function("el => el.innerText.trim().length > 0", arg=overview, timeout=5000)
             except Exception:
                 pass
-            html = await page.content()
-            await browser.close()
+            # só a subárvore de resultados (o parse lê "#search a"); página inteira se não houver #search
+            html = await page.evaluate(
+                "() => { const el = document.querySelector('#search'); return el ? el.outerHTML : null; }"
+            ) or await page.content()
         return {"raw_url": url, "raw": {"html": html, "source": "html"}}
 
     async def fetch(self, input: FetchInput) -> RawEvidence:
@@ -98,9 +126,13 @@ class GoogleSerpAdapter:
                 }
                 if no_cache is not None:
                     params_google["no_cache"] = "true" if bool(no_cache) else "false"
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    resp_google = await client.get(base_url, params=params_google)
-                    data_google = resp_google.json()
+                # Cliente compartilhado: a chamada do AI Overview reaproveita a conexão aquecida
+                client = get_http_client()
+                await rate_limit.acquire("serpapi", None, serp_key, config)
+                left = run_control.remaining(input)
+                extra = {"timeout": left} if left is not None else {}
+                resp_google = await client.get(base_url, params=params_google, **extra)
+                data_google = resp_google.json()
 
                 ai_block = (data_google or {}).get("ai_overview") or {}
                 ai_text_blocks = ai_block.get("text_blocks") or []
@@ -127,9 +159,11 @@ class GoogleSerpAdapter:
                         }
                         if no_cache is not None:
                             params_ai["no_cache"] = "true" if bool(no_cache) else "false"
-                        async with httpx.AsyncClient(timeout=30.0) as client:
-                            resp_ai = await client.get(base_url, params=params_ai)
-                            data_ai = resp_ai.json()
+                        await rate_limit.acquire("serpapi", None, serp_key, config)
+                        left = run_control.remaining(input)
+                        extra = {"timeout": left} if left is not None else {}
+                        resp_ai = await client.get(base_url, params=params_ai, **extra)
+                        data_ai = resp_ai.json()
                         ai_payload = (data_ai or {}).get("ai_overview") or {}
                         if ai_payload.get("text_blocks"):
                             return {
@@ -147,10 +181,10 @@ class GoogleSerpAdapter:
                 }
             except Exception:
                 # fallback para Playwright em caso de erro no SerpApi
-                return await self._fetch_with_playwright(query, language)
+                return await self._fetch_with_playwright(query, language, run_control.remaining(input))
 
         # fallback para Playwright
-        return await self._fetch_with_playwright(query, language)
+        return await self._fetch_with_playwright(query, language, run_control.remaining(input))
 
     def _should_skip(self, href: str) -> bool:
         if not href or href.startswith("/preferences") or href.startswith("/setprefs"):
@@ -161,6 +195,17 @@ class GoogleSerpAdapter:
             return True
         return False
 
+    async def _resolved_links(self, items: List[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+        """(url, título) -> links com redirects resolvidos em lote, sem hosts do próprio Google."""
+        resolved = await redirects.resolve_many(url for url, _title in items)
+        links: List[Dict[str, Any]] = []
+        for url, title in items:
+            url = resolved.get(url, url)
+            if not url or urlparse(url).netloc in BLOCKED_HOSTS:
+                continue
+            links.append({"url": url, "title": title})
+        return links
+
     async def parse(self, raw: RawEvidence) -> ParsedAnswer:
         src = (raw.get("raw") or {}).get("source")
         links = []
@@ -173,29 +218,15 @@ class GoogleSerpAdapter:
             references = ai.get("references") or []
 
             # links a partir das referências do AI Overview
-            for ref in references[:100]:
-                url = resolve_known_redirects(ref.get("link") or ref.get("url") or "")
-                title = ref.get("title")
-                if not url:
-                    continue
-                parsed_url = urlparse(url)
-                if parsed_url.netloc in BLOCKED_HOSTS:
-                    continue
-                links.append({"url": url, "title": title})
+            refs = [(ref.get("link") or ref.get("url") or "", ref.get("title")) for ref in references[:100]]
+            links = await self._resolved_links(refs)
 
             # Fallback: se AI Overview não trouxe 'references', usar organic_results da busca normal
             used_fallback = False
             if not links:
                 search_payload = (raw.get("raw") or {}).get("serpapi_search") or {}
-                for item in (search_payload.get("organic_results") or [])[:20]:
-                    url = resolve_known_redirects(item.get("link") or "")
-                    title = item.get("title")
-                    if not url:
-                        continue
-                    parsed_url = urlparse(url)
-                    if parsed_url.netloc in BLOCKED_HOSTS:
-                        continue
-                    links.append({"url": url, "title": title})
+                organic = [(item.get("link") or "", item.get("title")) for item in (search_payload.get("organic_results") or [])[:20]]
+                links = await self._resolved_links(organic)
                 used_fallback = len(links) > 0
 
             # texto consolidado dos text_blocks
@@ -233,12 +264,10 @@ class GoogleSerpAdapter:
         # 2) Resultados orgânicos via SerpApi (engine=google)
         if src == "serpapi":
             data = (raw.get("raw") or {}).get("serpapi") or {}
-            for item in data.get("organic_results", [])[:20]:
-                url = item.get("link")
-                title = item.get("title")
-                if url:
-                    url = resolve_known_redirects(url)
-                    links.append({"url": url, "title": title})
+            items = [item for item in data.get("organic_results", [])[:20] if item.get("link")]
+            resolved = await redirects.resolve_many(item["link"] for item in items)
+            for item in items:
+                links.append({"url": resolved.get(item["link"], item["link"]), "title": item.get("title")})
             text_content = (data.get("search_metadata") or {}).get("id", "")
             return {
                 "text": text_content,
@@ -250,7 +279,7 @@ class GoogleSerpAdapter:
         # 3) Fallback: HTML com Playwright
         html = (raw.get("raw") or {}).get("html") or ""
         soup = BeautifulSoup(html, "lxml")
-        seen = set()
+        anchors = []
         for a in soup.select("#search a"):
             href = a.get("href")
             if not href or self._should_skip(href):
@@ -263,7 +292,12 @@ class GoogleSerpAdapter:
                 url = href
             if not url:
                 continue
-            url = resolve_known_redirects(url)
+            anchors.append((url, a))
+        # redirects de todos os links resolvidos de uma vez (async, com cache)
+        resolved = await redirects.resolve_many(url for url, _a in anchors)
+        seen = set()
+        for url, a in anchors:
+            url = resolved.get(url, url)
             parsed = urlparse(url)
             if parsed.netloc in BLOCKED_HOSTS:
                 continue
@@ -5,9 +5,10 @@ import os
 import re
 from typing import List, Optional, Dict, Any
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from app.services.adapters.base import EngineAdapter, FetchInput, RawEvidence, ParsedAnswer, Citation
+from app.services import rate_limit, run_control
 
 
 URL_RE = re.compile(r"https?://[\w\-\.\?\,\'\/\+&%\$#_=:\(\)\*]+", re.IGNORECASE)
@@ -21,7 +22,12 @@ class OpenAIAdapter:
         # Keep env override but allow per-request override in fetch()
         # Default to a widely available model for compatibility
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-5")
-        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        # Cliente async: várias chamadas podem se sobrepor no mesmo event loop
+        self.client = AsyncOpenAI(api_key=self.api_key) if self.api_key else None
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.close()
 
     async def fetch(self, input: FetchInput) -> RawEvidence:
         """Call OpenAI Responses API, optionally with web_search_preview."""
@@ -93,8 +99,12 @@ class OpenAIAdapter:
                     kwargs["tool_choice"] = {"type": "web_search_preview"}
                 else:
                     kwargs["tool_choice"] = "auto"
-            def _create_with(kwargs_: Dict[str, Any]):
-                return self.client.responses.create(**kwargs_)  # type: ignore[attr-defined]
+            async def _create_with(kwargs_: Dict[str, Any]):
+                # cada tentativa é uma requisição ao provider: passa pelo rate limit compartilhado
+                await rate_limit.acquire("openai", model, self.api_key, cfg, rate_limit.estimate_tokens(str(kwargs_.get("input") or ""), max_output_tokens))
+                left = run_control.remaining(input)
+                extra = {"timeout": left} if left is not None else {}
+                return await self.client.responses.create(**kwargs_, **extra)  # type: ignore[attr-defined]
 
             # Estratégia de tentativas progressivas: full → sem reasoning → sem tools
             last_err: Exception | None = None
@@ -106,7 +116,7 @@ class OpenAIAdapter:
                     if attempt == "no_tools":
                         kwargs.pop("tools", None)
                         kwargs.pop("tool_choice", None)
-                    resp = _create_with(kwargs)
+                    resp = await _create_with(kwargs)
                     break
                 except Exception as e_first:
                     last_err = e_first
@@ -163,11 +173,13 @@ class OpenAIAdapter:
                         "Forneça a resposta final agora em texto corrido (sem perguntas), "
                         "organizada e com 3–5 fontes ao final usando URLs completas (http)."
                     )
-                    resp2 = self.client.responses.create(  # type: ignore[attr-defined]
-                        model=model,
-                        previous_response_id=raw_dict.get("id"),
-                        input=finalize_text,
-                        max_output_tokens=max_output_tokens,
+                    resp2 = await _create_with(
+                        {
+                            "model": model,
+                            "previous_response_id": raw_dict.get("id"),
+                            "input": finalize_text,
+                            "max_output_tokens": max_output_tokens,
+                        }
                     )
                     if hasattr(resp2, "model_dump"):
                         final_dict = resp2.model_dump()  # type: ignore[attr-defined]
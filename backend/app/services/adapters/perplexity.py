@@ -3,16 +3,17 @@ from __future__ import annotations
 import os
 from typing import List
 
-import httpx
-
 from app.services.adapters.base import EngineAdapter, FetchInput, RawEvidence, ParsedAnswer, Citation
+from app.services.http_client import get_http_client
+from app.services import rate_limit, run_control
 
 
 class PerplexityAdapter:
     name = "perplexity"
 
-    def __init__(self, api_key: str | None = None, timeout_seconds: float = 30.0) -> None:
+    def __init__(self, api_key: str | None = None, timeout_seconds: float | None = None) -> None:
         self.api_key = api_key or os.getenv("PERPLEXITY_API_KEY")
+        # None → timeouts padrão do cliente compartilhado (Settings.http_*)
         self.timeout_seconds = timeout_seconds
         self.base_url = "https://api.perplexity.ai"
 
@@ -33,10 +34,18 @@ class PerplexityAdapter:
         ]
         payload = {"model": model, "messages": messages}
         url = f"{self.base_url}/chat/completions"
-        async with httpx.AsyncClient(timeout=self.timeout_seconds) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            data = resp.json()
-            return {"raw_url": None, "raw": data}
+        await rate_limit.acquire("perplexity", model, self.api_key, input.get("config"), rate_limit.estimate_tokens(user_query, 1024))
+        # Cliente compartilhado do worker: reaproveita conexões keep-alive/HTTP2 entre requests
+        client = get_http_client()
+        timeout = self.timeout_seconds
+        left = run_control.remaining(input)
+        if left is not None:
+            # não esperar além do prazo da run
+            timeout = left if timeout is None else min(timeout, left)
+        extra = {"timeout": timeout} if timeout is not None else {}
+        resp = await client.post(url, headers=headers, json=payload, **extra)
+        data = resp.json()
+        return {"raw_url": None, "raw": data}
 
     async def parse(self, raw: RawEvidence) -> ParsedAnswer:
         data = raw.get("raw") or {}
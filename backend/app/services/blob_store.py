@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from app.core.config import settings
+
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except Exception:
+        return None
+    return zstandard
+
+
+def canonical_bytes(payload: Any) -> bytes:
+    """JSON canônico do payload (chaves ordenadas): payloads iguais têm os mesmos bytes e o mesmo hash."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def compress(data: bytes) -> bytes:
+    zstd = _zstd()
+    if zstd is not None:
+        return zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def decompress(blob: bytes) -> bytes:
+    # o formato vem dos magic bytes: blobs antigos continuam legíveis se a compressão mudar
+    if blob[:4] == ZSTD_MAGIC:
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("blob zstd sem o pacote zstandard instalado")
+        return zstd.ZstdDecompressor().decompress(blob, max_output_size=1 << 30)
+    if blob[:2] == GZIP_MAGIC:
+        return gzip.decompress(blob)
+    return blob
+
+
+class LocalBlobStore:
+    """Blobs em disco: <raiz>/ab/cd/<sha256>; gravação atômica (arquivo temporário + rename)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def put(self, digest: str, blob: bytes) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+
+class S3BlobStore:
+    """Blobs em bucket S3 (ou compatível, via endpoint_url): <prefixo><sha256>."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None) -> None:
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except Exception:
+            return False
+
+    def put(self, digest: str, blob: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=blob)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(digest))["Body"].read()
+        except Exception:
+            return None
+
+
+_backend: Any = None
+_lock = threading.Lock()
+
+
+def get_blob_store() -> Any:
+    """Backend configurado (settings.blob_store_backend), criado uma vez por processo."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if settings.blob_store_backend == "s3":
+                    if not settings.blob_store_s3_bucket:
+                        raise RuntimeError("blob_store_s3_bucket não configurado")
+                    _backend = S3BlobStore(
+                        settings.blob_store_s3_bucket,
+                        settings.blob_store_s3_prefix,
+                        settings.blob_store_s3_endpoint_url,
+                    )
+                else:
+                    _backend = LocalBlobStore(settings.blob_store_path)
+    return _backend
+
+
+def put_json(payload: Any) -> Tuple[str, int]:
+    """Guarda o payload (JSON canônico, comprimido) e devolve (sha256, tamanho em bytes do JSON).
+
+    Conteúdo idêntico é gravado uma única vez: se o hash já existe no store, nada é escrito.
+    """
+    data = canonical_bytes(payload)
+    digest = hashlib.sha256(data).hexdigest()
+    store = get_blob_store()
+    if not store.exists(digest):
+        store.put(digest, compress(data))
+    return digest, len(data)
+
+
+def get_json(digest: str) -> Any:
+    """Payload guardado sob `digest`, ou None se não existir no store."""
+    blob = get_blob_store().get(digest)
+    if blob is None:
+        return None
+    return json.loads(decompress(blob))
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.adapter_pool import register_stats_provider
+from app.services.runtime import runtime
+
+
+LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage"]
+
+
+class BrowserPool:
+    """Chromium headless único por worker, compartilhado pelos fetches de SERP concorrentes.
+
+    Cada consulta recebe um contexto novo (cookies/estado isolados) que é fechado ao final;
+    no máximo `browser_max_contexts` contextos abertos ao mesmo tempo. O browser é relançado
+    se cair (health check antes de cada uso) e reciclado após `browser_restart_after_pages`
+    páginas, esperando as páginas em uso terminarem.
+    """
+
+    def __init__(self) -> None:
+        self._pid = os.getpid()
+        self._playwright: Any = None
+        self._browser: Any = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._cond: Optional[asyncio.Condition] = None
+        self._active = 0
+        self._pages_since_launch = 0
+        self._hook_registered = False
+        self._counters = {"launches": 0, "restarts": 0, "pages": 0, "crashes": 0}
+        self._launched_at: Optional[float] = None
+
+    def _reset_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            self.__init__()
+
+    def _sync_primitives(self) -> None:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(max(1, int(settings.browser_max_contexts)))
+            self._cond = asyncio.Condition()
+
+    async def _launch(self) -> None:
+        from playwright.async_api import async_playwright
+
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        self._pages_since_launch = 0
+        self._launched_at = time.time()
+        self._counters["launches"] += 1
+        if not self._hook_registered:
+            runtime.add_shutdown_hook(self.aclose)
+            self._hook_registered = True
+
+    async def _close_browser(self) -> None:
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _ensure_browser(self) -> Any:
+        assert self._cond is not None
+        async with self._cond:
+            # reciclagem: espera as páginas em uso antes de relançar
+            if self._browser is not None and self._pages_since_launch >= settings.browser_restart_after_pages:
+                await self._cond.wait_for(lambda: self._active == 0)
+                if self._browser is not None and self._pages_since_launch >= settings.browser_restart_after_pages:
+                    await self._close_browser()
+                    self._counters["restarts"] += 1
+            if self._browser is not None and not self._browser.is_connected():
+                self._counters["crashes"] += 1
+                await self._close_browser()
+            if self._browser is None:
+                await self._launch()
+            self._active += 1
+            self._pages_since_launch += 1
+            self._counters["pages"] += 1
+            return self._browser
+
+    async def _release(self) -> None:
+        assert self._cond is not None
+        async with self._cond:
+            self._active = max(0, self._active - 1)
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def page(self, **context_options: Any) -> AsyncIterator[Any]:
+        """Página em um contexto novo do browser compartilhado; o contexto é fechado na saída."""
+        if not runtime.in_runtime_thread():
+            # fora do loop persistente do worker (ex.: chamadas pontuais da API): browser descartável
+            async with _one_shot_page(**context_options) as page:
+                yield page
+            return
+        self._reset_after_fork()
+        self._sync_primitives()
+        assert self._sem is not None
+        async with self._sem:
+            browser = await self._ensure_browser()
+            context = None
+            try:
+                context = await browser.new_context(**context_options)
+                yield await context.new_page()
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                await self._release()
+
+    async def aclose(self) -> None:
+        await self._close_browser()
+        pw, self._playwright = self._playwright, None
+        if pw is not None:
+            try:
+                await pw.stop()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "browser_running": bool(self._browser is not None),
+            "browser_active_pages": self._active,
+            "browser_pages_since_launch": self._pages_since_launch,
+            "browser_uptime_seconds": int(time.time() - self._launched_at) if self._launched_at and self._browser else None,
+            **{f"browser_{k}": v for k, v in self._counters.items()},
+        }
+
+
+@asynccontextmanager
+async def _one_shot_page(**context_options: Any) -> AsyncIterator[Any]:
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        try:
+            context = await browser.new_context(**context_options)
+            yield await context.new_page()
+        finally:
+            await browser.close()
+
+
+pool = BrowserPool()
+
+register_stats_provider(pool.stats)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis, key
+
+
+KEY_PATTERN = key("cb", "*")
+
+# Estados compartilhados entre workers: closed → open (após N falhas na janela) →
+# half_open (após open_seconds, um único probe passa) → closed (probe ok) ou open (probe falhou).
+_ALLOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local open_seconds = tonumber(ARGV[1])
+local probe_timeout = tonumber(ARGV[2])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+  return {1, 'closed', '0'}
+end
+if state == 'open' then
+  local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+  local remaining = opened_at + open_seconds - now
+  if remaining > 0 then
+    return {0, 'open', tostring(remaining)}
+  end
+  redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', now + probe_timeout)
+  return {1, 'half_open', '0'}
+end
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now < probe_until then
+  return {0, 'half_open', tostring(probe_until - now)}
+end
+redis.call('HSET', KEYS[1], 'probe_until', now + probe_timeout)
+return {1, 'half_open', '0'}
+"""
+
+_RECORD_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local outcome = ARGV[1]
+local threshold = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if outcome == 'success' then
+  if state ~= 'closed' or redis.call('HGET', KEYS[1], 'failures') then
+    redis.call('DEL', KEYS[1])
+  end
+  return 'closed'
+end
+if outcome == 'neutral' then
+  if state == 'half_open' then
+    redis.call('HSET', KEYS[1], 'probe_until', 0)
+  end
+  return state
+end
+if state == 'half_open' then
+  redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now, 'probe_until', 0)
+  redis.call('HINCRBY', KEYS[1], 'trips', 1)
+  return 'open'
+end
+if state == 'open' then
+  return 'open'
+end
+local window_start = tonumber(redis.call('HGET', KEYS[1], 'window_start') or '0')
+if now - window_start > window then
+  redis.call('HSET', KEYS[1], 'window_start', now, 'failures', 0)
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+redis.call('EXPIRE', KEYS[1], 86400)
+if failures >= threshold then
+  redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now, 'probe_until', 0)
+  redis.call('HINCRBY', KEYS[1], 'trips', 1)
+  return 'open'
+end
+return 'closed'
+"""
+
+# Resultados do classificador (concurrency.classify_outcome) que indicam indisponibilidade do provider
+FAILURE_OUTCOMES = ("server_error", "timeout")
+
+_scripts: Dict[Tuple[int, str], Any] = {}
+
+
+class CircuitOpenError(Exception):
+    """Breaker aberto para (engine, modelo): a chamada nem chega ao provider."""
+
+    error_code = "circuit_open"
+
+    def __init__(self, engine: str, model: str, retry_after: float) -> None:
+        super().__init__(f"Circuit breaker aberto para {engine}/{model}; nova tentativa em {retry_after:.0f}s")
+        self.engine = engine
+        self.model = model
+        self.retry_after = retry_after
+
+
+def breaker_key(engine: str, model: str | None) -> str:
+    return key("cb", engine, (model or "default").lower())
+
+
+def _script(r: Any, name: str, source: str) -> Any:
+    cache_key = (id(r), name)
+    if cache_key not in _scripts:
+        _scripts[cache_key] = r.register_script(source)
+    return _scripts[cache_key]
+
+
+def _outcome_kind(outcome: str) -> str:
+    if outcome == "ok":
+        return "success"
+    if outcome in FAILURE_OUTCOMES:
+        return "failure"
+    return "neutral"
+
+
+async def before_call(engine: str, model: str | None) -> None:
+    """Levanta CircuitOpenError se o breaker estiver aberto (ou com probe em andamento)."""
+    if not settings.circuit_breaker_enabled:
+        return
+    try:
+        r = get_async_redis()
+        allowed, state, remaining = await _script(r, "allow", _ALLOW_LUA)(
+            keys=[breaker_key(engine, model)],
+            args=[settings.circuit_breaker_open_seconds, settings.circuit_breaker_probe_timeout_seconds],
+        )
+    except Exception:
+        # Redis indisponível: não bloquear chamadas
+        return
+    if not int(allowed):
+        raise CircuitOpenError(engine, model or "default", float(remaining or 0))
+
+
+async def record(engine: str, model: str | None, outcome: str) -> None:
+    if not settings.circuit_breaker_enabled:
+        return
+    try:
+        r = get_async_redis()
+        await _script(r, "record", _RECORD_LUA)(
+            keys=[breaker_key(engine, model)],
+            args=[_outcome_kind(outcome), settings.circuit_breaker_failure_threshold, settings.circuit_breaker_window_seconds],
+        )
+    except Exception:
+        pass
+
+
+def list_circuits() -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    try:
+        r = get_redis()
+        for k in r.scan_iter(match=KEY_PATTERN, count=100):
+            data = {kk.decode(): vv.decode() for kk, vv in (r.hgetall(k) or {}).items()}
+            name = k.decode() if isinstance(k, bytes) else str(k)
+            _, _, engine, model = name.split(":", 3)
+            out.append({"engine": engine, "model": model, "state": data.get("state", "closed"), **data})
+    except Exception:
+        pass
+    return out
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis, key
+
+
+STATS_KEY_PATTERN = key("aimd", "*")
+PUBLISH_INTERVAL_SECONDS = 2.0
+STATS_TTL_SECONDS = 120
+
+# Sinais extraídos das mensagens de erro dos adapters / SDKs
+THROTTLE_MARKERS = ("rate limit", "rate_limit", "too many requests", "resource_exhausted", "quota")
+SERVER_ERROR_MARKERS = (
+    "internal server error",
+    "unavailable",
+    "bad gateway",
+    "service unavailable",
+    "overloaded",
+)
+TIMEOUT_MARKERS = ("timeout", "timed out", "deadline exceeded", "readtimeout", "connecttimeout")
+# status HTTP só como número isolado: "max_tokens 5000" ou ids com "503" não contam
+_THROTTLE_STATUS_RE = re.compile(r"(?<![\w.])429(?![\w.])")
+_SERVER_STATUS_RE = re.compile(r"(?<![\w.])50[0234](?![\w.])")
+# payloads da SerpAPI guardam o JSON de cada chamada sob estas chaves (erro em {"error": "..."})
+_NESTED_ERROR_KEYS = ("serpapi", "serpapi_search", "serpapi_ai")
+
+
+def _classify_status(status: Any) -> Optional[str]:
+    try:
+        code = int(status)
+    except (TypeError, ValueError):
+        return None
+    if code == 429:
+        return "throttled"
+    if code in (500, 502, 503, 504):
+        return "server_error"
+    return None
+
+
+def _classify_message(msg: str) -> str:
+    lower = (msg or "").lower()
+    if _THROTTLE_STATUS_RE.search(lower) or any(m in lower for m in THROTTLE_MARKERS):
+        return "throttled"
+    if any(m in lower for m in TIMEOUT_MARKERS):
+        return "timeout"
+    if _SERVER_STATUS_RE.search(lower) or any(m in lower for m in SERVER_ERROR_MARKERS):
+        return "server_error"
+    return "error"
+
+
+def _classify_error(err: Any, message: Any = None) -> str:
+    if err == "missing_api_key":
+        return "error"
+    if isinstance(err, dict):
+        # Perplexity/OpenAI-like: {"error": {"message", "type", "code"}}
+        return _classify_status(err.get("code")) or _classify_message(
+            " ".join(str(err.get(k) or "") for k in ("code", "type", "message"))
+        )
+    return _classify_message(f"{err} {message or ''}")
+
+
+def classify_outcome(raw: Optional[Dict[str, Any]] = None, exc: Optional[BaseException] = None) -> str:
+    """Classifica o resultado de um fetch: ok | throttled | server_error | timeout | error.
+
+    Os adapters não levantam exceção em falhas de provider; devolvem payloads como
+    `{"error": "openai_request_failed", "message": ...}` (OpenAI), `fetch_failed`/`no_tool_worked`
+    (Gemini, com os erros de cada estratégia) ou o JSON de erro do provider (Perplexity e SerpAPI,
+    este aninhado em `serpapi`/`serpapi_search`/`serpapi_ai`). Status HTTP só contam como número
+    isolado ou via `status_code` da exceção.
+    """
+    if exc is not None:
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+            return "timeout"
+        # SDKs/httpx expõem o status HTTP: `status_code` ou `response.status_code`
+        status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+        return _classify_status(status) or _classify_message(f"{type(exc).__name__}: {exc}")
+    payload = (raw or {}).get("raw")
+    if not isinstance(payload, dict):
+        return "ok"
+    if payload.get("error"):
+        return _classify_error(payload["error"], payload.get("message"))
+    # SerpAPI: {"serpapi": {"error": "..."}} e afins
+    for nested_key in _NESTED_ERROR_KEYS:
+        nested = payload.get(nested_key)
+        if isinstance(nested, dict) and nested.get("error"):
+            return _classify_error(nested["error"], nested.get("message"))
+    return "ok"
+
+
+class AdaptiveLimit:
+    """Controle AIMD do número de chamadas simultâneas a uma engine neste processo.
+
+    Aumenta o alvo em `aimd_increase / limite` a cada sucesso com latência saudável
+    (≈ +1 por "janela" de chamadas) e multiplica por `aimd_backoff` em 429/5xx/timeout,
+    no máximo uma redução por `aimd_cooldown_seconds`. O teto é o limite fixo da engine.
+    """
+
+    def __init__(self, engine: str, max_limit: int) -> None:
+        self.engine = engine
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(settings.aimd_min_limit), self.max_limit))
+        self.limit = float(max(self.min_limit, self.max_limit // 2 or 1))
+        self.in_flight = 0
+        self.latency_ewma_ms: Optional[float] = None
+        self.last_signal = "ok"
+        self.last_decrease = 0.0
+        self.counters = {"ok": 0, "throttled": 0, "server_error": 0, "timeout": 0, "error": 0}
+        self._cond = asyncio.Condition()
+
+    def set_max(self, max_limit: int) -> None:
+        self.max_limit = max(1, int(max_limit))
+        self.limit = min(self.limit, float(self.max_limit))
+
+    @property
+    def target(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.target)
+            self.in_flight += 1
+
+    async def release(self, outcome: str, latency_ms: float) -> None:
+        self.counters[outcome] = self.counters.get(outcome, 0) + 1
+        self.last_signal = outcome
+        now = time.monotonic()
+        if outcome in ("throttled", "server_error", "timeout"):
+            if now - self.last_decrease >= settings.aimd_cooldown_seconds:
+                self.limit = max(float(self.min_limit), self.limit * settings.aimd_backoff)
+                self.last_decrease = now
+        elif outcome == "ok":
+            healthy = self.latency_ewma_ms is None or latency_ms <= self.latency_ewma_ms * settings.aimd_latency_factor
+            if healthy:
+                self.limit = min(float(self.max_limit), self.limit + settings.aimd_increase / max(self.limit, 1.0))
+            # EWMA lenta como linha de base da latência saudável
+            self.latency_ewma_ms = latency_ms if self.latency_ewma_ms is None else 0.9 * self.latency_ewma_ms + 0.1 * latency_ms
+        async with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "target": self.target,
+            "limit": round(self.limit, 2),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "latency_ewma_ms": int(self.latency_ewma_ms) if self.latency_ewma_ms is not None else None,
+            "last_signal": self.last_signal,
+            **self.counters,
+        }
+
+
+class AdaptiveConcurrency:
+    """Controladores AIMD por engine do processo, com estado publicado no Redis."""
+
+    def __init__(self) -> None:
+        self._limits: Dict[str, AdaptiveLimit] = {}
+        self._pid = os.getpid()
+        self._last_publish = 0.0
+
+    def get(self, engine: str, max_limit: int) -> AdaptiveLimit:
+        if self._pid != os.getpid():
+            self._limits, self._pid = {}, os.getpid()
+        ctl = self._limits.get(engine)
+        if ctl is None:
+            ctl = AdaptiveLimit(engine, max_limit)
+            self._limits[engine] = ctl
+        elif ctl.max_limit != max_limit:
+            ctl.set_max(max_limit)
+        return ctl
+
+    @asynccontextmanager
+    async def slot(self, engine: str, max_limit: int) -> AsyncIterator["_Slot"]:
+        ctl = self.get(engine, max_limit)
+        if not settings.aimd_enabled:
+            yield _Slot()
+            return
+        await ctl.acquire()
+        slot = _Slot()
+        try:
+            yield slot
+        finally:
+            await ctl.release(slot.outcome, (time.perf_counter() - slot.started) * 1000)
+            self._maybe_publish()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "engines": {name: ctl.snapshot() for name, ctl in self._limits.items()},
+        }
+
+    def _maybe_publish(self) -> None:
+        now = time.monotonic()
+        if now - self._last_publish < PUBLISH_INTERVAL_SECONDS:
+            return
+        self._last_publish = now
+        asyncio.get_running_loop().create_task(self._publish())
+
+    async def _publish(self) -> None:
+        try:
+            r = get_async_redis()
+            await r.set(key("aimd", f"{socket.gethostname()}-{os.getpid()}"), json.dumps(self.snapshot()), ex=STATS_TTL_SECONDS)
+        except Exception:
+            pass
+
+
+class _Slot:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.outcome = "ok"
+
+    def record(self, outcome: str) -> None:
+        self.outcome = outcome
+
+
+controller = AdaptiveConcurrency()
+
+
+def collect_concurrency_stats() -> Dict[str, Any]:
+    """Alvos AIMD publicados pelos workers, com o total em voo/alvo por engine."""
+    workers: List[Dict[str, Any]] = []
+    totals: Dict[str, Dict[str, int]] = {}
+    try:
+        r = get_redis()
+        for k in r.scan_iter(match=STATS_KEY_PATTERN, count=100):
+            raw = r.get(k)
+            if raw:
+                workers.append(json.loads(raw))
+    except Exception:
+        pass
+    for w in workers:
+        for engine, snap in (w.get("engines") or {}).items():
+            agg = totals.setdefault(engine, {"target": 0, "in_flight": 0, "max_limit": 0})
+            agg["target"] += int(snap.get("target") or 0)
+            agg["in_flight"] += int(snap.get("in_flight") or 0)
+            agg["max_limit"] += int(snap.get("max_limit") or 0)
+    return {"engines": totals, "workers": workers}
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.models import Domain
+from app.services.normalization import normalize_domains
+
+
+Rows = Sequence[Tuple[str, Optional[str]]]
+
+
+def _rows(domains: Iterable[Any]) -> List[Tuple[str, Optional[str]]]:
+    """(domínio, pattern_regex) ordenados e sem duplicatas, de objetos Domain ou linhas (domain, pattern_regex)."""
+    rows = {
+        ((d.domain or "").strip().lower(), (d.pattern_regex or "").strip() or None)
+        for d in domains
+        if (d.domain or "").strip() or (d.pattern_regex or "").strip()
+    }
+    return sorted(rows, key=lambda r: (r[0], r[1] or ""))
+
+
+# esquema e usuário opcionais; o grupo é o host (sem porta, colchetes de IPv6 fora)
+_HOST_RE = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.\-]*://)?(?:[^@/?#]*@)?\[?([^/?#:\]]*)")
+
+
+def _host(value: str) -> str:
+    # só regex pré-compilado (sem urlparse): caminho quente da classificação
+    return _HOST_RE.match(value).group(1).rstrip(".").lower()
+
+
+# limites do `pattern_regex` do usuário: tamanho do padrão e do trecho da URL avaliado
+MAX_PATTERN_LENGTH = 200
+MAX_MATCH_INPUT = 2048
+
+
+_QUANT_RE = re.compile(r"[+*]|\{(\d*)(?:,(\d*))?\}")
+
+
+def _repeats(quant: "re.Match[str]") -> bool:
+    # `{1}`, `{0,1}` e afins não repetem; `+`, `*`, `{n,}` e `{m,n}` com n > 1 sim
+    if quant.group(0) in "+*":
+        return True
+    low, high = quant.group(1), quant.group(2)
+    if high is None:
+        return int(low or 0) > 1 or "," in quant.group(0)
+    return high == "" or int(high) > 1
+
+
+def _ambiguous_repeat(pattern: str) -> bool:
+    """Grupo repetido (`+`, `*`, `{n,}`) que contém quantificador, alternância ou backreference.
+
+    `(a+)+`, `(\\w*\\.)*` e `(a|aa)+` deixam o mesmo trecho casar de várias formas a cada
+    repetição: backtracking exponencial no `re`. A varredura é léxica (escapes e classes `[...]`
+    são pulados) e conservadora de propósito: `(www\\.|blog\\.)?` passa, `(foo|bar)+` não.
+    """
+    stack: List[bool] = []  # por grupo aberto: contém quantificador, `|` ou backreference?
+    closed = False  # o token anterior fechou um grupo arriscado
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "\\":
+            if stack and i + 1 < n and pattern[i + 1] in "123456789":
+                stack[-1] = True
+            i += 2
+            closed = False
+            continue
+        if c == "[":
+            i += 1
+            if i < n and pattern[i] == "^":
+                i += 1
+            if i < n and pattern[i] == "]":
+                i += 1
+            while i < n and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            closed = False
+            continue
+        quant = _QUANT_RE.match(pattern, i)
+        if quant and _repeats(quant):
+            if closed:
+                return True
+            if stack:
+                stack[-1] = True
+            i = quant.end()
+            closed = False
+            continue
+        if c == "(":
+            # `(?P=nome)` é backreference por nome
+            stack.append(pattern.startswith("(?P=", i))
+            if stack[-1] and len(stack) > 1:
+                stack[-2] = True
+            closed = False
+        elif c == ")":
+            inner = stack.pop() if stack else False
+            if inner and stack:
+                stack[-1] = True
+            closed = inner
+        elif c == "|":
+            if stack:
+                stack[-1] = True
+            closed = False
+        elif c not in "?":
+            # `?` (opcional ou lazy) não repete; mantém o estado do grupo recém-fechado
+            closed = False
+        i += 1
+    return False
+
+
+def pattern_error(pattern: str) -> Optional[str]:
+    """Motivo para recusar um `pattern_regex` (None se aceitável)."""
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f"pattern_regex maior que {MAX_PATTERN_LENGTH} caracteres"
+    try:
+        re.compile(pattern, re.IGNORECASE)
+    except re.error as exc:
+        return f"pattern_regex inválido: {exc}"
+    if _ambiguous_repeat(pattern):
+        return "pattern_regex com grupo repetido contendo quantificador, alternância ou backreference (ex.: (a+)+, (a|aa)+) não é permitido"
+    return None
+
+
+def fingerprint(rows: Rows) -> str:
+    return hashlib.sha1(json.dumps(list(rows), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class DomainMatcher:
+    """Classifica URLs/domínios como do projeto: domínio exato, qualquer subdomínio e `pattern_regex`.
+
+    Os domínios (registráveis) ficam num conjunto consultado para cada sufixo do host, e todos
+    os `pattern_regex` aceitos por `pattern_error` viram uma única alternância pré-compilada
+    (case-insensitive) ancorada no início do host ou da URL sem esquema, limitada a `MAX_MATCH_INPUT`
+    caracteres; padrões recusados (inválidos, longos ou com repetição ambígua, que
+    podem ter sido gravados antes da validação) são ignorados.
+    """
+
+    def __init__(self, rows: Rows) -> None:
+        self.fingerprint = fingerprint(rows)
+        self.domains = frozenset(d for d in normalize_domains(d for d, _ in rows if d) if d)
+        self.invalid_patterns: List[str] = []
+        patterns: List[str] = []
+        for _, pattern in rows:
+            if not pattern:
+                continue
+            if pattern_error(pattern):
+                self.invalid_patterns.append(pattern)
+                continue
+            patterns.append(pattern)
+        self._pattern_res: List[Pattern[str]] = []
+        if patterns:
+            try:
+                self._pattern_res = [re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)]
+            except re.error:
+                # ex.: grupos nomeados repetidos entre padrões; cada um compilado separadamente
+                self._pattern_res = [re.compile(p, re.IGNORECASE) for p in patterns]
+
+    def matches(self, url_or_domain: str) -> bool:
+        value = (url_or_domain or "").strip()[:MAX_MATCH_INPUT]
+        if not value:
+            return False
+        host = _host(value)
+        if self.domains:
+            # domínio exato ou qualquer subdomínio: um lookup no conjunto por sufixo do host
+            suffix = host
+            while suffix:
+                if suffix in self.domains:
+                    return True
+                dot = suffix.find(".")
+                if dot < 0:
+                    break
+                suffix = suffix[dot + 1 :]
+        if not self._pattern_res:
+            return False
+        # âncora: início do host ou da URL sem o esquema (ex.: `blog\.exemplo\.com/artigos`)
+        rest = value.partition("://")[2] or value
+        return any(r.match(host) or r.match(rest) for r in self._pattern_res)
+
+    def classify(self, values: Iterable[str]) -> List[bool]:
+        """`matches` em lote: cada valor distinto é avaliado uma única vez."""
+        items = list(values)
+        distinct = {v: self.matches(v) for v in set(items)}
+        return [distinct[v] for v in items]
+
+
+_matchers: Dict[str, DomainMatcher] = {}
+_lock = threading.Lock()
+
+
+def for_rows(project_id: str, domains: Iterable[Any]) -> DomainMatcher:
+    """Matcher do projeto a partir de linhas já carregadas; recompilado só quando as linhas mudam."""
+    rows = _rows(domains)
+    fp = fingerprint(rows)
+    matcher = _matchers.get(project_id)
+    if matcher is None or matcher.fingerprint != fp:
+        matcher = DomainMatcher(rows)
+        with _lock:
+            _matchers[project_id] = matcher
+    return matcher
+
+
+def for_project(db: Session, project_id: str) -> DomainMatcher:
+    rows = db.query(Domain.domain, Domain.pattern_regex).filter(Domain.project_id == project_id).all()
+    return for_rows(project_id, rows)
+
+
+def invalidate(project_id: str) -> None:
+    with _lock:
+        _matchers.pop(project_id, None)
@@ -1,29 +1,94 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Tuple, List
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, Tuple, List, Optional, Union
 
+from app.core.config import settings
 from app.services.adapters.perplexity import PerplexityAdapter
 from app.services.adapters.google_serp import GoogleSerpAdapter
 from app.services.adapters.openai_adapter import OpenAIAdapter
 from app.services.adapters.gemini import GeminiAdapter
 from app.services.adapters.sandbox import SandboxAdapter
 from app.services.adapters.base import FetchInput, ParsedAnswer, Citation, RawEvidence
+from app.services.adapter_pool import pool as adapter_pool
+from app.services import circuit_breaker, hedging, response_cache, run_control, single_flight
+from app.services.concurrency import classify_outcome, controller as concurrency
+from app.services.runtime import runtime
 
 
-def get_adapter(name: str):
+EngineResult = Tuple[RawEvidence, ParsedAnswer, List[Citation]]
+BLOCKING_GRACE_SECONDS = 30.0
+CycleResults = List[Union[EngineResult, BaseException]]
+
+ENGINE_ALIASES: Dict[str, str] = {
+    "perplexity": "perplexity",
+    "pplx": "perplexity",
+    "google_serp": "google_serp",
+    "google-ai": "google_serp",
+    "google": "google_serp",
+    "openai": "openai",
+    "gpt": "openai",
+    "gemini": "gemini",
+    "google_gemini": "gemini",
+    "sandbox": "sandbox",
+    "demo": "sandbox",
+    "fixture": "sandbox",
+}
+
+
+def canonical_engine_name(name: str) -> str:
     key = (name or "").strip().lower()
-    if key in ("perplexity", "pplx"):
+    if key not in ENGINE_ALIASES:
+        raise ValueError(f"Engine não suportado: {name}")
+    return ENGINE_ALIASES[key]
+
+
+def _build_adapter(key: str):
+    if key == "perplexity":
         return PerplexityAdapter()
-    if key in ("google_serp", "google-ai", "google"):
+    if key == "google_serp":
         return GoogleSerpAdapter()
-    if key in ("openai", "gpt"):
+    if key == "openai":
         return OpenAIAdapter()
-    if key in ("gemini", "google_gemini"):
+    if key == "gemini":
         return GeminiAdapter()
-    if key in ("sandbox", "demo", "fixture"):
-        return SandboxAdapter()
-    raise ValueError(f"Engine não suportado: {name}")
+    return SandboxAdapter()
+
+
+def get_adapter(name: str):
+    """Adapter reutilizável do processo (ver adapter_pool): mantém clientes SDK/HTTP entre runs."""
+    key = canonical_engine_name(name)
+    return adapter_pool.get(key, lambda: _build_adapter(key))
+
+
+def engine_concurrency_limit(name: str, cfg: dict | None = None) -> int:
+    """Limite de chamadas simultâneas por engine: config_json["max_concurrency"] > settings."""
+    value = (cfg or {}).get("max_concurrency")
+    if value is None:
+        try:
+            value = settings.engine_concurrency.get(canonical_engine_name(name))
+        except ValueError:
+            value = None
+    try:
+        return max(1, int(value or settings.engine_concurrency_default))
+    except (TypeError, ValueError):
+        return max(1, int(settings.engine_concurrency_default))
+
+
+class EngineSlots:
+    """Semáforos por engine compartilhados entre as runs de um mesmo lote (execute_batch)."""
+
+    def __init__(self) -> None:
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+
+    def get(self, name: str, cfg: dict | None = None) -> asyncio.Semaphore:
+        key = canonical_engine_name(name)
+        if key not in self._sems:
+            # o primeiro config visto define o limite da engine no lote
+            self._sems[key] = asyncio.Semaphore(engine_concurrency_limit(name, cfg))
+        return self._sems[key]
 
 
 async def _run_adapter(adapter, fetch_input: FetchInput) -> Tuple[RawEvidence, ParsedAnswer, List[Citation]]:
@@ -34,6 +99,152 @@ async def _run_adapter(adapter, fetch_input: FetchInput) -> Tuple[RawEvidence, P
     return raw, parsed, citations
 
 
+def effective_model(adapter, cfg: dict | None) -> str:
+    return str((cfg or {}).get("model") or getattr(adapter, "model", None) or getattr(adapter, "default_model", None) or "default")
+
+
+def fetch_cache_key(name: str, fetch_input: FetchInput) -> str:
+    """Hash canônico do fetch_input efetivo (engine + modelo efetivo + query + opções)."""
+    key = canonical_engine_name(name)
+    return response_cache.fetch_hash(key, effective_model(get_adapter(key), fetch_input.get("config")), fetch_input)
+
+
+async def _execute(name: str, fetch_input: FetchInput) -> EngineResult:
+    """Uma chamada completa à engine dentro do prazo da run e sujeita a cancelamento (run_control.guard)."""
+    return await run_control.guard(_execute_once(name, fetch_input), fetch_input)
+
+
+async def _execute_once(name: str, fetch_input: FetchInput) -> EngineResult:
+    """Cache de respostas, single-flight, circuit breaker (engine/modelo) e AIMD em volta do adapter."""
+    key = canonical_engine_name(name)
+    # adapter em uso até o fim da chamada: rotação de credenciais não o fecha no meio do fetch
+    with adapter_pool.lease(key, lambda: _build_adapter(key)) as adapter:
+        return await _execute_with(key, adapter, fetch_input)
+
+
+async def _execute_with(key: str, adapter, fetch_input: FetchInput) -> EngineResult:
+    cfg = fetch_input.get("config") or {}
+    model = effective_model(adapter, cfg)
+    ttl = response_cache.ttl_for(key, cfg)
+    coalesce = single_flight.enabled(cfg)
+    digest = response_cache.fetch_hash(key, model, fetch_input) if (ttl or coalesce) else None
+    if digest and ttl:
+        hit = await response_cache.get(key, digest)
+        if hit is not None:
+            raw, parsed, citations, age = hit
+            return raw, response_cache.mark_hit(parsed, digest, age), citations
+    if digest and coalesce:
+        # chamadas idênticas simultâneas (neste e em outros workers) compartilham um único fetch
+        result = await single_flight.do(
+            key, digest, lambda: _call(key, model, adapter, fetch_input), lambda res: classify_outcome(res[0]) == "ok"
+        )
+    else:
+        result = await _call(key, model, adapter, fetch_input)
+    if ttl and not single_flight.is_shared(result[1]) and classify_outcome(result[0]) == "ok":
+        await response_cache.put(key, digest, ttl, *result)
+    return result
+
+
+async def _call(key: str, model: str, adapter, fetch_input: FetchInput) -> EngineResult:
+    """Fetch com hedge opcional (config_json["hedge"]) para runs interativas: se não responder até o
+    percentil configurado da latência histórica da engine, dispara uma cópia e fica com a primeira resposta ok."""
+    opts = hedging.hedge_options(fetch_input.get("config")) if fetch_input.get("priority") != "batch" else None
+    delay = await hedging.hedge_delay(key, opts) if opts else None
+    if delay is None:
+        return await _fetch(key, model, adapter, fetch_input)
+    return await hedging.race(lambda: _fetch(key, model, adapter, fetch_input), delay, lambda res: classify_outcome(res[0]) == "ok")
+
+
+async def _fetch(key: str, model: str, adapter, fetch_input: FetchInput) -> EngineResult:
+    cfg = fetch_input.get("config") or {}
+    # breaker aberto: falha rápida sem ocupar slot nem chamar o provider
+    await circuit_breaker.before_call(key, model)
+    async with concurrency.slot(key, engine_concurrency_limit(key, cfg)) as slot:
+        try:
+            result = await _run_adapter(adapter, fetch_input)
+        except BaseException as e:
+            outcome = classify_outcome(None, e)
+            slot.record(outcome)
+            await circuit_breaker.record(key, model, outcome)
+            raise
+        outcome = classify_outcome(result[0])
+        slot.record(outcome)
+        await circuit_breaker.record(key, model, outcome)
+        if outcome == "ok":
+            await hedging.record_latency(key, time.perf_counter() - slot.started)
+        return result
+
+
+def _blocking_timeout(fetch_input: FetchInput) -> Optional[float]:
+    # rede de segurança caso o loop fique bloqueado e o guard async não consiga agir
+    left = run_control.remaining(fetch_input)
+    return None if left is None else left + BLOCKING_GRACE_SECONDS
+
+
 def run_engine(name: str, fetch_input: FetchInput) -> Tuple[RawEvidence, ParsedAnswer, List[Citation]]:
-    adapter = get_adapter(name)
-    return asyncio.run(_run_adapter(adapter, fetch_input))
+    # Loop persistente por processo: evita criar/destruir event loop (e conexões) a cada ciclo
+    return runtime.run(_execute(name, fetch_input), timeout=_blocking_timeout(fetch_input))
+
+
+async def _run_cycles(
+    name: str,
+    fetch_input: FetchInput,
+    cycles: int,
+    concurrency: int,
+    slots: Optional[EngineSlots] = None,
+) -> Tuple[CycleResults, int]:
+    sem = asyncio.Semaphore(max(1, int(concurrency or 1)))
+    engine_sem = slots.get(name, fetch_input.get("config")) if slots is not None else None
+    t0: Optional[float] = None
+
+    async def _one():
+        nonlocal t0
+        async with sem:
+            if engine_sem is not None:
+                await engine_sem.acquire()
+            try:
+                # latência e prazo da run contam a partir da primeira chamada efetiva (não incluem espera por slot)
+                if t0 is None:
+                    t0 = time.perf_counter()
+                run_control.start_deadline(fetch_input)
+                return await _execute(name, fetch_input)
+            finally:
+                if engine_sem is not None:
+                    engine_sem.release()
+
+    # Resultados na ordem dos ciclos; exceções retornadas no lugar do resultado do ciclo
+    results = await asyncio.gather(*(_one() for _ in range(max(1, int(cycles or 1)))), return_exceptions=True)
+    latency_ms = int((time.perf_counter() - (t0 or time.perf_counter())) * 1000)
+    return list(results), latency_ms
+
+
+def run_engine_cycles(name: str, fetch_input: FetchInput, cycles: int, concurrency: int) -> Tuple[CycleResults, int]:
+    """Executa `cycles` chamadas idênticas à engine em paralelo (no máximo `concurrency` simultâneas).
+
+    Retorna os resultados por ciclo e a latência total em ms.
+    """
+    return runtime.run(_run_cycles(name, fetch_input, cycles, concurrency), timeout=_blocking_timeout(fetch_input))
+
+
+def submit_engine_cycles(
+    name: str, fetch_input: FetchInput, cycles: int, concurrency: int, slots: EngineSlots
+) -> "Future[Tuple[CycleResults, int]]":
+    """Versão não bloqueante de `run_engine_cycles` respeitando os limites por engine do lote."""
+    return runtime.submit(_run_cycles(name, fetch_input, cycles, concurrency, slots))
+
+
+def batch_wait_timeout(fetch_inputs: Iterable[FetchInput]) -> Optional[float]:
+    """Espera máxima por progresso de um lote de `submit_engine_cycles` (None = sem prazo).
+
+    O maior `_blocking_timeout` entre as runs pendentes; runs ainda na fila do slot (prazo não
+    iniciado) contam com o prazo cheio. Se nenhuma terminar nesse intervalo, o loop travou.
+    """
+    timeouts: List[float] = []
+    for fetch_input in fetch_inputs:
+        left = run_control.remaining(fetch_input)
+        if left is None:
+            left = fetch_input.get("deadline_seconds") or None
+        if left is None:
+            return None
+        timeouts.append(float(left) + BLOCKING_GRACE_SECONDS)
+    return max(timeouts, default=None)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, key
+
+
+Result = Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]
+
+
+def _history_key(engine: str) -> str:
+    return key("lat", engine)
+
+
+def hedge_options(cfg: Dict[str, Any] | None) -> Optional[Dict[str, Any]]:
+    """Opções de hedge da engine (opt-in): config_json["hedge"] = true ou {"percentile", "min_samples", "min_delay_seconds"}."""
+    value = (cfg or {}).get("hedge")
+    if not value:
+        return None
+    opts: Dict[str, Any] = {
+        "percentile": settings.hedge_percentile,
+        "min_samples": settings.hedge_min_samples,
+        "min_delay_seconds": settings.hedge_min_delay_seconds,
+    }
+    if isinstance(value, dict):
+        opts.update({k: v for k, v in value.items() if v is not None})
+    return opts
+
+
+async def record_latency(engine: str, seconds: float) -> None:
+    """Guarda a latência de um fetch bem-sucedido no histórico (lista limitada) da engine."""
+    try:
+        r = get_async_redis()
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.lpush(_history_key(engine), f"{seconds:.3f}")
+            pipe.ltrim(_history_key(engine), 0, settings.hedge_history_size - 1)
+            await pipe.execute()
+    except Exception:
+        pass
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def hedge_delay(engine: str, opts: Dict[str, Any]) -> Optional[float]:
+    """Segundos a esperar antes do pedido duplicado; None se ainda não há histórico suficiente."""
+    try:
+        raw = await get_async_redis().lrange(_history_key(engine), 0, -1)
+        samples = [float(v) for v in raw or []]
+    except Exception:
+        return None
+    if len(samples) < int(opts["min_samples"]):
+        return None
+    return max(float(opts["min_delay_seconds"]), _percentile(samples, float(opts["percentile"])))
+
+
+def _mark(parsed: Dict[str, Any], info: Dict[str, Any]) -> Dict[str, Any]:
+    meta = dict(parsed.get("meta") or {})
+    meta["hedge"] = info
+    return {**parsed, "meta": meta}
+
+
+def extra_requests(parsed: Dict[str, Any] | None) -> int:
+    return int((((parsed or {}).get("meta") or {}).get("hedge") or {}).get("extra_requests") or 0)
+
+
+async def race(call: Callable[[], Awaitable[Result]], delay: float, is_ok: Callable[[Result], bool]) -> Result:
+    """Dispara `call`; se não responder em `delay`s, dispara uma cópia. A primeira resposta ok vence e a outra é cancelada."""
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(call())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(call())
+        tasks.append(hedge)
+        names = {primary: "primary", hedge: "hedge"}
+        pending = {primary, hedge}
+        fallback: Optional[asyncio.Future] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                if fut.cancelled():
+                    # cancelada por fora (ex.: cancelamento/prazo da run): perdedora, nunca vence
+                    fallback = fallback or fut
+                    continue
+                if fut.exception() is None and is_ok(fut.result()):
+                    raw, parsed, citations = fut.result()
+                    info = {
+                        "fired": True,
+                        "delay_ms": int(delay * 1000),
+                        "winner": names[fut],
+                        "extra_requests": 1,
+                        "elapsed_ms": int((time.perf_counter() - started) * 1000),
+                    }
+                    return raw, _mark(parsed, info), citations
+                if fallback is None or fallback.cancelled():
+                    fallback = fut
+        # nenhuma resposta ok: devolve a primeira que terminou sem ser cancelada (erro ou exceção)
+        raw, parsed, citations = fallback.result()
+        return raw, _mark(parsed, {"fired": True, "delay_ms": int(delay * 1000), "winner": None, "extra_requests": 1}), citations
+    finally:
+        # a perdedora (ou ambas, se esta chamada foi cancelada) não continua consumindo o provider
+        for fut in tasks:
+            if not fut.done():
+                fut.cancel()
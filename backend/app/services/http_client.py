@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.adapter_pool import register_stats_provider
+from app.services.runtime import runtime
+
+
+# Um cliente por event loop: no worker é o loop persistente do AsyncRuntime
+_clients: Dict[int, httpx.AsyncClient] = {}
+_counters = {"created": 0, "requests": 0}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    timeout = httpx.Timeout(
+        settings.http_timeout_seconds,
+        connect=settings.http_connect_timeout_seconds,
+        pool=settings.http_pool_timeout_seconds,
+    )
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_seconds,
+    )
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=limits,
+        # HTTP/2 quando o pacote h2 estiver instalado; o servidor negocia via ALPN
+        http2=bool(settings.http2_enabled and _http2_available()),
+        event_hooks={"request": [_count_request]},
+    )
+
+
+async def _count_request(_request: httpx.Request) -> None:
+    _counters["requests"] += 1
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente httpx async compartilhado (keep-alive, limites e timeouts vindos de Settings)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(id(loop))
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[id(loop)] = client
+        _counters["created"] += 1
+        if runtime.in_runtime_thread():
+            runtime.add_shutdown_hook(close_http_client)
+    return client
+
+
+async def close_http_client() -> None:
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(id(loop), None)
+    if client is not None:
+        await client.aclose()
+
+
+def http_pool_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"http_clients": len(_clients), **{f"http_{k}": v for k, v in _counters.items()}}
+    connections: Optional[int] = None
+    try:
+        # httpcore não expõe API pública de contagem; melhor esforço
+        connections = sum(len(getattr(c._transport._pool, "connections", [])) for c in _clients.values())  # type: ignore[attr-defined]
+    except Exception:
+        connections = None
+    stats["http_open_connections"] = connections
+    return stats
+
+
+register_stats_provider(http_pool_stats)
@@ -1,22 +1,39 @@
 from __future__ import annotations
 
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 import os
 
 from app.models.models import Run, Citation, Insight, Domain, Engine, PromptVersion
+from app.services import domain_matcher
+from app.services.domain_matcher import DomainMatcher
 
 
-def generate_basic_insights(db: Session, run: Run) -> List[Insight]:
+# citações de link: menções textuais (type "mention") ficam fora dos insights e agregados de domínios
+NON_MENTION_CITATIONS = or_(Citation.type.is_(None), Citation.type != "mention")
+
+
+def generate_basic_insights(
+    db: Session,
+    run: Run,
+    matcher: Optional[DomainMatcher] = None,
+    citations: Optional[List[Citation]] = None,
+) -> List[Insight]:
     """Gera insights heurísticos simples pós-run.
     - Se não houver citações do domínio alvo: sugerir FAQ/HowTo, atualizar conteúdos e comparativos
     - Se houver citações concorrentes recorrentes: sugerir página comparativa
+    `matcher` (domínios do projeto) e `citations` podem vir pré-carregados (worker) para evitar novas consultas.
     """
     insights: List[Insight] = []
-    project_domains = {d.domain for d in db.query(Domain).filter(Domain.project_id == run.project_id).all()}
-    citations = db.query(Citation).filter(Citation.run_id == run.id).all()
-    our_hit = any(c.domain in project_domains for c in citations)
+    if matcher is None:
+        matcher = domain_matcher.for_project(db, run.project_id)
+    if citations is None:
+        citations = db.query(Citation).filter(Citation.run_id == run.id, NON_MENTION_CITATIONS).all()
+    else:
+        citations = [c for c in citations if c.type != "mention"]
+    ours = matcher.classify([c.url or c.domain or "" for c in citations])
+    our_hit = any(ours)
 
     if not our_hit:
         insights.append(Insight(
@@ -30,7 +47,7 @@ def generate_basic_insights(db: Session, run: Run) -> List[Insight]:
         ))
 
     # Top concorrente desta run
-    competitor_domains = [c.domain for c in citations if c.domain not in project_domains]
+    competitor_domains = [c.domain for c, is_ours in zip(citations, ours) if not is_ours]
     if competitor_domains:
         top = competitor_domains[0]
         insights.append(Insight(
@@ -88,7 +105,7 @@ def generate_subproject_insights(db: Session, subproject_id: str) -> Dict[str, A
     citations = (
         db.query(Citation.run_id, Citation.domain, Citation.url)
         .join(Run, Run.id == Citation.run_id)
-        .filter(Run.subproject_id == subproject_id)
+        .filter(Run.subproject_id == subproject_id, NON_MENTION_CITATIONS)
         .limit(1000)
         .all()
     )
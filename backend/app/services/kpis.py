@@ -1,83 +1,126 @@
 from __future__ import annotations
 
-from typing import List
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.models.models import Citation, Run
 from app.schemas.schemas import RunReport, CitationOut
-from app.services.normalization import normalize_domain, normalize_url_for_dedupe
+from app.services import domain_matcher
+from app.services.domain_matcher import DomainMatcher
+from app.services.normalization import canonical_url, normalize_domain
 
 
-def compute_amr(citations: List[Citation], our_domains: set[str]) -> float:
+# Relatórios de runs concluídas (imutáveis) memoizados no processo
+REPORT_MEMO_SIZE = 512
+_report_memo: "OrderedDict[Tuple[Any, ...], Tuple[float, float, float, List[CitationOut]]]" = OrderedDict()
+
+
+def compute_amr(citations: List[CitationOut]) -> float:
     # AMR: existe menção (link ou textual) a pelo menos um domínio nosso
-    has_mention = any(c.domain in our_domains for c in citations)
+    has_mention = any(c.is_ours for c in citations)
     return 1.0 if has_mention else 0.0
 
 
-def compute_dcr(citations: List[Citation], our_domains: set[str]) -> float:
-    has_link = any(c.domain in our_domains and (c.type or "").lower() == "link" for c in citations)
+def compute_dcr(citations: List[CitationOut]) -> float:
+    has_link = any(c.is_ours and (c.type or "").lower() == "link" for c in citations)
     return 1.0 if has_link else 0.0
 
 
-def compute_zcrs(citations: List[Citation]) -> float:
+def compute_zcrs(citations: List[CitationOut]) -> float:
     # Heurística simplificada para MVP
     links_useful = sum(1 for c in citations if (c.type or "").lower() == "link")
-    mentions = len(citations)
+    # menções textuais (type "mention") não entram: o score segue medindo as citações da resposta
+    mentions = sum(1 for c in citations if (c.type or "").lower() != "mention")
     pos_weight = 1.0
     score = 100 - (20 * links_useful + 10 * mentions + 5 * pos_weight)
     return max(0.0, min(100.0, float(score)))
 
 
-def compute_run_report(db: Session, run_id: str) -> RunReport:
-    run = db.get(Run, run_id)
-    citations_raw = db.query(Citation).filter(Citation.run_id == run_id).all()
-
-    # Dedup por URL normalizada
-    unique: dict[str, Citation] = {}
-    for c in citations_raw:
-        url_norm = normalize_url_for_dedupe(c.url or c.domain or "")
-        dom_norm = normalize_domain(url_norm)
+def dedupe_citations(citations: List[Citation], matcher: DomainMatcher) -> List[CitationOut]:
+    """Citações únicas por (domínio, âncora, tipo), com URL/domínio normalizados.
+
+    Sem rede e sem alterar os objetos ORM: usa `url_normalized` gravado na ingestão e, para
+    linhas antigas (NULL), a normalização offline de `canonical_url`. `is_ours` é reavaliado
+    com o matcher atual do projeto (domínios e pattern_regex).
+    """
+    unique: dict[str, CitationOut] = {}
+    for c in citations:
+        if c.url_normalized:
+            url_norm, dom_norm = c.url_normalized, c.domain
+        else:
+            url_norm = canonical_url(c.url or c.domain or "")
+            dom_norm = normalize_domain(url_norm)
         key = f"{dom_norm}|{(c.anchor or '').strip()}|{(c.type or '').strip()}"
         if key not in unique:
-            # sobrescrever campos normalizados em memória (não persistente)
-            c.url = url_norm
-            c.domain = dom_norm
-            unique[key] = c
-    citations = list(unique.values())
-
-    # Descobrir domínios do projeto
-    from app.models.models import Domain, Project, Engine, PromptVersion, Prompt
-
-    engine = db.get(Engine, run.engine_id)
-    project = db.get(Project, run.project_id)
-    domains = db.query(Domain).filter(Domain.project_id == project.id).all()
-    # Normalizar domínios do projeto para compatibilizar com Citation.domain normalizado
-    our_domains = {normalize_domain(d.domain) for d in domains if d.domain}
-
-    amr = compute_amr(citations, our_domains)
-    dcr = compute_dcr(citations, our_domains)
-    zcrs = compute_zcrs(citations)
-
-    run.amr_flag = amr == 1.0
-    run.dcr_flag = dcr == 1.0
-    run.zcrs = zcrs
-    db.commit()
+            unique[key] = CitationOut(
+                domain=dom_norm,
+                url=url_norm,
+                anchor=c.anchor,
+                position=c.position,
+                type=c.type,
+                is_ours=matcher.matches(c.url or c.domain or ""),
+            )
+    return list(unique.values())
+
+
+def _memo_key(run: Run, matcher: DomainMatcher) -> Optional[Tuple[Any, ...]]:
+    # só runs concluídas: as citações não mudam mais depois de finished_at
+    if run.status != "completed" or run.finished_at is None:
+        return None
+    return (run.id, run.finished_at, run.citations_count, matcher.fingerprint)
+
+
+def compute_run_report(
+    db: Session,
+    run_id: str,
+    run: Optional[Run] = None,
+    citations: Optional[List[Citation]] = None,
+    matcher: Optional[DomainMatcher] = None,
+    commit: bool = True,
+) -> RunReport:
+    """Relatório de KPIs da run.
+
+    `run`, `citations` e o `matcher` de domínios do projeto podem vir pré-carregados pelo worker,
+    evitando novas consultas; com `commit=False` as flags ficam na transação do chamador.
+    O cálculo não faz chamadas de rede e, para runs concluídas, é memoizado no processo.
+    """
+    run = run or db.get(Run, run_id)
+
+    # Domínios do projeto (matcher compilado, em cache no processo)
+    if matcher is None:
+        matcher = domain_matcher.for_project(db, run.project_id)
+
+    memo_key = _memo_key(run, matcher)
+    cached = _report_memo.get(memo_key) if memo_key is not None else None
+    if cached is not None:
+        _report_memo.move_to_end(memo_key)
+        amr, dcr, zcrs, unique = cached
+    else:
+        if citations is None:
+            citations = db.query(Citation).filter(Citation.run_id == run_id).all()
+        unique = dedupe_citations(citations, matcher)
+        amr = compute_amr(unique)
+        dcr = compute_dcr(unique)
+        zcrs = compute_zcrs(unique)
+        if memo_key is not None:
+            _report_memo[memo_key] = (amr, dcr, zcrs, unique)
+            while len(_report_memo) > REPORT_MEMO_SIZE:
+                _report_memo.popitem(last=False)
+
+    # GET do relatório não escreve no banco quando as flags já estão em dia
+    if (run.amr_flag, run.dcr_flag, run.zcrs) != (amr == 1.0, dcr == 1.0, zcrs):
+        run.amr_flag = amr == 1.0
+        run.dcr_flag = dcr == 1.0
+        run.zcrs = zcrs
+        if commit:
+            db.commit()
 
     return RunReport(
         id=run.id,
         amr=amr,
         dcr=dcr,
         zcrs=zcrs,
-        citations=[
-            CitationOut(
-                domain=c.domain,
-                url=c.url,
-                anchor=c.anchor,
-                position=c.position,
-                type=c.type,
-                is_ours=c.is_ours,
-            )
-            for c in citations
-        ],
+        citations=list(unique),
         reasons=[],
     )
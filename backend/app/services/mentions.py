@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.services.normalization import normalize_domains
+
+
+# Termos (já dobrados) mais curtos que isso geram falsos positivos demais
+MIN_TERM_LENGTH = 3
+SCANNER_CACHE_SIZE = 64
+
+_URL_RE = re.compile(r"https?://\S+")
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    # sem acento e sem caixa: "Ação" -> "acao"
+    decomposed = unicodedata.normalize("NFKD", ch)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def fold(text: str) -> Tuple[str, List[int]]:
+    """Texto sem acentos/caixa e o mapa de offsets: offsets[i] = índice no original do caractere i."""
+    chars: List[str] = []
+    offsets: List[int] = []
+    for i, ch in enumerate(text):
+        for c in _fold_char(ch):
+            chars.append(c)
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+def fold_term(term: str) -> str:
+    return " ".join(fold(term)[0].split())
+
+
+class MentionScanner:
+    """Autômato Aho-Corasick sobre os termos dobrados (sem acento/caixa) -> domínio dono do termo.
+
+    Uma passada linear no texto encontra todas as ocorrências; ficam as mais longas, sem
+    sobreposição, com borda de palavra e fora de URLs.
+    """
+
+    def __init__(self, terms: Dict[str, str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        for term, domain in terms.items():
+            self._add(term, domain)
+        self._build()
+
+    def _add(self, term: str, domain: str) -> None:
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state].append((len(term), domain))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fail = self._fail[state]
+                    while fail and ch not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # saídas do sufixo mais longo (fail) também valem neste estado
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _iter(self, folded: str) -> Iterator[Tuple[int, int, str]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, domain in out[state]:
+                yield i + 1 - length, i + 1, domain
+
+    def scan(self, text: str) -> List[Tuple[int, int, str]]:
+        """(início, fim, domínio) no texto ORIGINAL de cada menção encontrada."""
+        if not text:
+            return []
+        folded, offsets = fold(text)
+        blocked = [m.span() for m in _URL_RE.finditer(folded)]
+        found = sorted(self._iter(folded), key=lambda m: (m[0], -(m[1] - m[0])))
+        result: List[Tuple[int, int, str]] = []
+        last_end = 0
+        url_idx = 0
+        for start, end, domain in found:
+            if start < last_end:
+                continue
+            if (start > 0 and folded[start - 1].isalnum()) or (end < len(folded) and folded[end].isalnum()):
+                continue
+            while url_idx < len(blocked) and blocked[url_idx][1] <= start:
+                url_idx += 1
+            if url_idx < len(blocked) and blocked[url_idx][0] < end:
+                continue
+            result.append((offsets[start], offsets[end - 1] + 1, domain))
+            last_end = end
+        return result
+
+
+def build_terms(
+    project_name: Optional[str], project_domains: Iterable[str], competitor_domains: Iterable[str] = ()
+) -> Dict[str, str]:
+    """termo dobrado -> domínio dono; termos do projeto têm precedência sobre os de concorrentes.
+
+    Só termos inequívocos: o nome do projeto e domínios registráveis completos
+    (`casa.com.br`, nunca o rótulo solto `casa`, que casaria com a palavra comum).
+    """
+    terms: Dict[str, str] = {}
+    ours = [d for d in normalize_domains(project_domains) if d]
+    for domain in [d for d in normalize_domains(competitor_domains) if d] + ours:
+        folded = fold_term(domain)
+        if len(folded) >= MIN_TERM_LENGTH:
+            terms[folded] = domain
+    name = fold_term(project_name or "")
+    if ours and len(name) >= MIN_TERM_LENGTH:
+        terms[name] = ours[0]
+    return terms
+
+
+_scanners: "OrderedDict[frozenset, MentionScanner]" = OrderedDict()
+
+
+def scanner_for(terms: Dict[str, str]) -> MentionScanner:
+    """Autômato para o conjunto de termos, reaproveitado enquanto os termos não mudam (LRU no processo)."""
+    fp = frozenset(terms.items())
+    scanner = _scanners.get(fp)
+    if scanner is None:
+        scanner = MentionScanner(terms)
+        _scanners[fp] = scanner
+        while len(_scanners) > SCANNER_CACHE_SIZE:
+            _scanners.popitem(last=False)
+    else:
+        _scanners.move_to_end(fp)
+    return scanner
+
+
+def mention_citations(text: str, scanner: MentionScanner) -> List[Dict[str, Any]]:
+    """Citações `type: "mention"` para cada menção no texto; `position` = "início-fim" (offsets de caractere)."""
+    return [
+        {
+            "domain": domain,
+            "url": None,
+            "anchor": text[start:end],
+            "position": f"{start}-{end}",
+            "type": "mention",
+        }
+        for start, end, domain in scanner.scan(text)
+    ]
@@ -1,17 +1,102 @@
 from __future__ import annotations
 
+import ipaddress
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
 from urllib.parse import urlparse, parse_qs, urlunparse
-import httpx
 
 
-def normalize_domain(url_or_domain: str) -> str:
-    value = (url_or_domain or "").strip().lower()
-    if not value:
-        return value
+# Subconjunto da Public Suffix List empacotado com o app (ver cabeçalho do arquivo)
+PUBLIC_SUFFIX_FILE = Path(__file__).parent / "data" / "public_suffix_list.dat"
+DOMAIN_CACHE_SIZE = 262144
+
+# marcadores nos nós da trie: fim de regra e fim de exceção ("!")
+_RULE = ""
+_EXCEPTION = "!"
+
+
+@lru_cache(maxsize=1)
+def _suffix_trie() -> Dict[str, Any]:
+    """Trie dos sufixos públicos, por rótulo, do TLD para a esquerda."""
+    root: Dict[str, Any] = {}
+    try:
+        lines = PUBLIC_SUFFIX_FILE.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        lines = []
+    for line in lines:
+        rule = line.strip().split(" ")[0].lower()
+        if not rule or rule.startswith("//"):
+            continue
+        exception = rule.startswith("!")
+        node = root
+        for label in reversed(rule.lstrip("!").split(".")):
+            node = node.setdefault(label, {})
+        node[_EXCEPTION if exception else _RULE] = True
+    return root
+
+
+def _public_suffix_size(labels: List[str]) -> int:
+    """Quantos rótulos finais de `labels` formam o sufixo público (regra padrão "*" = 1)."""
+    size = 1
+    nodes = [_suffix_trie()]
+    for depth, label in enumerate(reversed(labels), start=1):
+        children = []
+        for node in nodes:
+            for key in (label, "*"):
+                child = node.get(key)
+                if child is None:
+                    continue
+                if child.get(_EXCEPTION):
+                    # exceção: o próprio rótulo já é registrável
+                    return depth - 1
+                if child.get(_RULE):
+                    size = max(size, depth)
+                children.append(child)
+        if not children:
+            break
+        nodes = children
+    return size
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def registrable_domain(host: str) -> str:
+    """Domínio registrável (eTLD+1) de um host: blog.banco.com.br -> banco.com.br."""
+    host = (host or "").strip().lower().rstrip(".")
+    if not host or "." not in host or _is_ip(host):
+        return host
+    labels = host.split(".")
+    size = _public_suffix_size(labels)
+    if size >= len(labels):
+        # o host é ele mesmo um sufixo público
+        return host
+    return ".".join(labels[-(size + 1) :])
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def host_of(value: str) -> str:
+    """Host (sem porta/usuário) de uma URL ou de um domínio já "nu"."""
     if "://" in value:
         netloc = urlparse(value).netloc
     else:
-        netloc = value
+        netloc = value.split("/", 1)[0]
+    netloc = netloc.rsplit("@", 1)[-1]
+    if netloc.startswith("["):
+        # IPv6 literal
+        return netloc[1:].split("]", 1)[0]
+    return netloc.split(":", 1)[0]
+
+
+def _canonical_netloc(netloc: str) -> str:
+    # na URL canônica o host continua completo (subdomínio importa), só sem www./m.
+    netloc = netloc.lower()
     if netloc.startswith("www."):
         netloc = netloc[4:]
     if netloc.startswith("m."):
@@ -19,6 +104,22 @@ def normalize_domain(url_or_domain: str) -> str:
     return netloc
 
 
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def normalize_domain(url_or_domain: str) -> str:
+    """Domínio registrável de uma URL ou host (subdomínios, www. e m. caem juntos)."""
+    value = (url_or_domain or "").strip().lower()
+    if not value:
+        return value
+    return registrable_domain(host_of(value))
+
+
+def normalize_domains(values: Iterable[str]) -> List[str]:
+    """`normalize_domain` em lote: cada valor distinto é normalizado uma única vez."""
+    items = list(values)
+    distinct = {v: normalize_domain(v) for v in set(items)}
+    return [distinct[v] for v in items]
+
+
 def extract_url_from_google_wrapper(url: str) -> str:
     """Se a URL for google redirect (/url?q=...), retorna o valor de q."""
     try:
@@ -33,38 +134,26 @@ def extract_url_from_google_wrapper(url: str) -> str:
     return url
 
 
-def resolve_vertexai_grounding_redirect(url: str, timeout_seconds: float = 8.0) -> str:
-    """Segue o redirect do endpoint vertexaisearch grounding-api-redirect e retorna a URL final."""
+def is_vertexai_grounding_redirect(url: str) -> bool:
     try:
         parsed = urlparse(url)
-        if parsed.netloc == "vertexaisearch.cloud.google.com" and "grounding-api-redirect" in parsed.path:
-            with httpx.Client(follow_redirects=False, timeout=timeout_seconds) as client:
-                r = client.get(url)
-                if 300 <= r.status_code < 400:
-                    loc = r.headers.get("location") or r.headers.get("Location")
-                    if loc:
-                        return loc
     except Exception:
-        pass
-    return url
-
-
-def resolve_known_redirects(url: str) -> str:
-    if not url:
-        return url
-    url1 = extract_url_from_google_wrapper(url)
-    url2 = resolve_vertexai_grounding_redirect(url1)
-    return url2
+        return False
+    return parsed.netloc == "vertexaisearch.cloud.google.com" and "grounding-api-redirect" in parsed.path
 
 
-def normalize_url_for_dedupe(url: str) -> str:
-    """Normaliza URL para deduplicação: schema/host lowercase, remove fragmentos e UTMs, remove trailing '/'."""
+@lru_cache(maxsize=65536)
+def canonical_url(url: str) -> str:
+    """Normaliza URL para deduplicação, sem rede: desembrulha /url?q= do Google, schema/host lowercase,
+    remove fragmentos, UTMs e trailing '/'. Redirects de grounding são resolvidos antes, em
+    `redirects.resolve_many`.
+    """
     if not url:
         return url
-    url = resolve_known_redirects(url)
+    url = extract_url_from_google_wrapper(url)
     p = urlparse(url)
     scheme = (p.scheme or "http").lower()
-    netloc = normalize_domain(p.netloc or "")
+    netloc = _canonical_netloc(p.netloc or "")
     path = (p.path or "/").rstrip("/") or "/"
     # remove parâmetros de tracking comuns
     if p.query:
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.models import Citation, Evidence, gen_id
+from app.services import blob_store
+from app.services.domain_matcher import DomainMatcher
+from app.services.normalization import canonical_url, normalize_domains
+
+
+# Linhas por INSERT multi-valores (mantém o statement longe do limite de parâmetros do Postgres)
+INSERT_CHUNK_SIZE = 1000
+
+
+def citation_rows(run_id: str, extracted: Iterable[Dict[str, Any]], matcher: DomainMatcher) -> List[Dict[str, Any]]:
+    """Monta as linhas de `citations` de uma vez: ids no cliente, URL/domínio normalizados e is_ours.
+
+    A URL normalizada (sem rede: os redirects já foram resolvidos pelos adapters) fica gravada em
+    `url_normalized`, e o relatório da run não precisa normalizar de novo.
+    """
+    items = list(extracted)
+    # normaliza cada URL/domínio distinto uma única vez
+    sources = [c.get("url") or c.get("domain") or "" for c in items]
+    distinct = list(set(sources))
+    url_norms = [canonical_url(src) if "://" in src else None for src in distinct]
+    domains = normalize_domains([u or src for u, src in zip(url_norms, distinct)])
+    normalized = dict(zip(distinct, zip(url_norms, domains, matcher.classify(distinct))))
+    rows: List[Dict[str, Any]] = []
+    for c, src in zip(items, sources):
+        url_norm, domain, ours = normalized[src]
+        rows.append(
+            {
+                "id": gen_id("ctt"),
+                "run_id": run_id,
+                "domain": domain,
+                "url": c.get("url"),
+                "url_normalized": url_norm if c.get("url") else None,
+                "anchor": c.get("anchor"),
+                "position": c.get("position"),
+                "type": c.get("type"),
+                "is_ours": ours,
+            }
+        )
+    return rows
+
+
+def evidence_row(run_id: str, raw: Dict[str, Any], parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha de `evidences`: o payload bruto vai para o blob store (por hash) e a linha guarda só o resumo.
+
+    Se o blob store falhar, o payload fica inline em `parsed_json["raw"]` como antes.
+    """
+    parsed_json: Dict[str, Any] = {
+        "parsed": {"text": parsed.get("text"), "links": parsed.get("links"), "meta": parsed.get("meta")},
+    }
+    content_hash, content_size = None, None
+    payload = raw.get("raw")
+    if payload is not None:
+        try:
+            content_hash, content_size = blob_store.put_json(payload)
+        except Exception:
+            parsed_json["raw"] = payload
+    return {
+        "id": gen_id("evd"),
+        "run_id": run_id,
+        "raw_url": raw.get("raw_url"),
+        "parsed_json": parsed_json,
+        "screenshot_url": None,
+        "content_hash": content_hash,
+        "content_size": content_size,
+    }
+
+
+def hydrate_evidence(evidence: Evidence) -> Dict[str, Any]:
+    """`parsed_json` com o payload bruto de volta em "raw" (lido do blob store quando não está inline)."""
+    data = dict(evidence.parsed_json or {})
+    if "raw" not in data and evidence.content_hash:
+        try:
+            data["raw"] = blob_store.get_json(evidence.content_hash)
+        except Exception:
+            data["raw"] = None
+    return data
+
+
+def _bulk_insert(db: Session, model: Any, rows: List[Dict[str, Any]]) -> int:
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(insert(model).values(rows[start : start + INSERT_CHUNK_SIZE]))
+    return len(rows)
+
+
+def bulk_insert_evidences(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """INSERT multi-valores em `evidences` (sem commit; a transação fica com o chamador)."""
+    return _bulk_insert(db, Evidence, rows)
+
+
+def bulk_insert_citations(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """INSERT multi-valores em `citations` (sem commit; a transação fica com o chamador)."""
+    return _bulk_insert(db, Citation, rows)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import random
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, key
+
+
+# Token bucket duplo (requisições/min e tokens/min) avaliado atomicamente no Redis.
+# Retorna 0 quando consumiu, ou quantos ms esperar até haver saldo nos dois buckets.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local function level(k, capacity)
+  local data = redis.call('HMGET', k, 'tokens', 'ts')
+  local tokens = tonumber(data[1])
+  local ts = tonumber(data[2])
+  if tokens == nil or ts == nil then
+    return capacity
+  end
+  local elapsed = math.max(0, now - ts)
+  return math.min(capacity, tokens + elapsed * capacity / 60000)
+end
+
+local wait = 0
+local req_level = 0
+local tok_level = 0
+if rpm > 0 then
+  req_level = level(KEYS[1], rpm)
+  if req_level < 1 then
+    wait = math.max(wait, (1 - req_level) * 60000 / rpm)
+  end
+end
+if tpm > 0 then
+  cost = math.min(cost, tpm)
+  tok_level = level(KEYS[2], tpm)
+  if tok_level < cost then
+    wait = math.max(wait, (cost - tok_level) * 60000 / tpm)
+  end
+end
+if wait > 0 then
+  return math.ceil(wait)
+end
+if rpm > 0 then
+  redis.call('HSET', KEYS[1], 'tokens', req_level - 1, 'ts', now)
+  redis.call('PEXPIRE', KEYS[1], 120000)
+end
+if tpm > 0 then
+  redis.call('HSET', KEYS[2], 'tokens', tok_level - cost, 'ts', now)
+  redis.call('PEXPIRE', KEYS[2], 120000)
+end
+return 0
+"""
+
+_scripts: Dict[int, Any] = {}
+
+
+def estimate_tokens(text: str | None, max_output_tokens: int | None = None) -> int:
+    """Estimativa de tokens da chamada (entrada ~4 chars/token + teto de saída) para o bucket TPM."""
+    return int(math.ceil(len(text or "") / 4)) + int(max_output_tokens or 0)
+
+
+def resolve_limits(provider: str, model: str | None, cfg: dict | None) -> Dict[str, int]:
+    """Limites efetivos: Engine.config_json["rate_limit"] > settings.rate_limits["provider:model"] > ["provider"]."""
+    limits: Dict[str, Any] = {}
+    limits.update(settings.rate_limits.get(provider) or {})
+    if model:
+        limits.update(settings.rate_limits.get(f"{provider}:{str(model).lower()}") or {})
+    override = (cfg or {}).get("rate_limit")
+    if isinstance(override, dict):
+        limits.update(override)
+    out: Dict[str, int] = {}
+    for k in ("rpm", "tpm"):
+        try:
+            out[k] = max(0, int(limits.get(k) or 0))
+        except (TypeError, ValueError):
+            out[k] = 0
+    return out
+
+
+def _bucket_key(provider: str, model: str | None, api_key: str | None) -> str:
+    # a chave de API nunca vai em claro para o Redis
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    return key("rl", provider, (model or "default").lower(), key_hash)
+
+
+async def acquire(
+    provider: str,
+    model: str | None = None,
+    api_key: str | None = None,
+    cfg: dict | None = None,
+    tokens: int = 0,
+    max_wait_seconds: Optional[float] = None,
+) -> float:
+    """Aguarda saldo no token bucket compartilhado de (provider, model, api_key).
+
+    Retorna o tempo esperado em segundos. Sem Redis, sem limites configurados ou com
+    `rate_limit_enabled=False` retorna imediatamente (fail-open). Após `max_wait_seconds`
+    a chamada segue mesmo sem saldo, para não travar a run indefinidamente.
+    """
+    if not settings.rate_limit_enabled:
+        return 0.0
+    limits = resolve_limits(provider, model, cfg)
+    if not limits["rpm"] and not limits["tpm"]:
+        return 0.0
+    budget = settings.rate_limit_max_wait_seconds if max_wait_seconds is None else max_wait_seconds
+    base = _bucket_key(provider, model, api_key)
+    started = time.monotonic()
+    try:
+        r = get_async_redis()
+        script = _scripts.get(id(r))
+        if script is None:
+            script = r.register_script(_TOKEN_BUCKET_LUA)
+            _scripts[id(r)] = script
+        while True:
+            wait_ms = int(await script(keys=[f"{base}:req", f"{base}:tok"], args=[limits["rpm"], limits["tpm"], int(tokens or 0)]))
+            if wait_ms <= 0:
+                break
+            elapsed = time.monotonic() - started
+            if elapsed >= budget:
+                break
+            # jitter evita que workers acordem juntos e disputem o mesmo token
+            await asyncio.sleep(min(wait_ms / 1000.0, budget - elapsed) * (1 + random.random() * 0.1))
+    except Exception:
+        # Redis indisponível: não bloquear o fetch
+        pass
+    return time.monotonic() - started
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from typing import Dict, Iterable, List
+
+from app.core.config import settings
+from app.services.http_client import get_http_client
+from app.services.normalization import extract_url_from_google_wrapper, is_vertexai_grounding_redirect
+from app.services.redis_client import get_async_redis, key
+
+
+def _cache_key(url: str) -> str:
+    return key("redir", hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+
+async def _resolve_one(url: str, sem: asyncio.Semaphore) -> str | None:
+    async with sem:
+        try:
+            r = await get_http_client().get(
+                url, follow_redirects=False, timeout=settings.redirect_resolve_timeout_seconds
+            )
+        except Exception:
+            return None
+    if 300 <= r.status_code < 400:
+        return r.headers.get("location") or None
+    return None
+
+
+async def resolve_many(urls: Iterable[str]) -> Dict[str, str]:
+    """Resolve em lote os redirects conhecidos de uma resposta: {url original: url final}.
+
+    Wrappers do Google (/url?q=) são desembrulhados localmente; links de grounding do
+    vertexaisearch são buscados no cache do Redis e os que faltam são resolvidos em paralelo
+    (até `redirect_resolve_concurrency` por vez) e gravados com TTL. Falhas mantêm a URL
+    original e não são cacheadas.
+    """
+    resolved: Dict[str, str] = {}
+    pending: List[str] = []
+    for url in urls:
+        if not url or url in resolved:
+            continue
+        target = extract_url_from_google_wrapper(url)
+        resolved[url] = target
+        if is_vertexai_grounding_redirect(target) and target not in pending:
+            pending.append(target)
+    if not pending:
+        return resolved
+
+    found: Dict[str, str] = {}
+    r = None
+    try:
+        r = get_async_redis()
+        for target, value in zip(pending, await r.mget([_cache_key(u) for u in pending])):
+            if value:
+                found[target] = value.decode("utf-8")
+    except Exception:
+        r = None
+
+    misses = [u for u in pending if u not in found]
+    if misses:
+        sem = asyncio.Semaphore(max(1, int(settings.redirect_resolve_concurrency)))
+        results = await asyncio.gather(*(_resolve_one(u, sem) for u in misses))
+        fresh = {u: loc for u, loc in zip(misses, results) if loc}
+        found.update(fresh)
+        if fresh and r is not None:
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    for u, loc in fresh.items():
+                        pipe.set(_cache_key(u), loc, ex=settings.redirect_cache_ttl_seconds)
+                    await pipe.execute()
+            except Exception:
+                pass
+
+    return {url: found.get(target, target) for url, target in resolved.items()}
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.services.runtime import runtime
+
+
+# Prefixo comum das chaves de coordenação entre workers (limiter, breaker, cache...)
+KEY_PREFIX = "seo:"
+
+_sync_client: Optional[redis.Redis] = None
+_sync_pid: Optional[int] = None
+_async_clients: Dict[tuple, aioredis.Redis] = {}
+_lock = threading.Lock()
+
+
+def key(*parts: str) -> str:
+    return KEY_PREFIX + ":".join(str(p) for p in parts)
+
+
+def get_redis() -> redis.Redis:
+    """Cliente Redis síncrono por processo (recriado após fork)."""
+    global _sync_client, _sync_pid
+    if _sync_client is None or _sync_pid != os.getpid():
+        with _lock:
+            if _sync_client is None or _sync_pid != os.getpid():
+                _sync_client = redis.Redis.from_url(
+                    settings.redis_url,
+                    socket_timeout=2.0,
+                    socket_connect_timeout=2.0,
+                    health_check_interval=30,
+                )
+                _sync_pid = os.getpid()
+    return _sync_client
+
+
+def get_async_redis(url: Optional[str] = None) -> aioredis.Redis:
+    """Cliente Redis async ligado ao event loop corrente (um por loop e URL; padrão settings.redis_url)."""
+    loop = asyncio.get_running_loop()
+    url = url or settings.redis_url
+    client = _async_clients.get((id(loop), url))
+    if client is None:
+        client = aioredis.Redis.from_url(
+            url,
+            socket_timeout=2.0,
+            socket_connect_timeout=2.0,
+            health_check_interval=30,
+        )
+        first = not any(k[0] == id(loop) for k in _async_clients)
+        _async_clients[(id(loop), url)] = client
+        if first and runtime.in_runtime_thread():
+            runtime.add_shutdown_hook(close_async_redis)
+    return client
+
+
+async def close_async_redis() -> None:
+    loop = asyncio.get_running_loop()
+    for k in [k for k in _async_clients if k[0] == id(loop)]:
+        client = _async_clients.pop(k)
+        try:
+            await client.aclose()
+        except Exception:
+            pass
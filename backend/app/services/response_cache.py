@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, key
+
+
+# Chaves de Engine.config_json que não mudam a resposta do provider (execução, limites, preço)
+NON_SEMANTIC_CONFIG_KEYS = frozenset(
+    {
+        "cache",
+        "cache_ttl_seconds",
+        "single_flight",
+        "hedge",
+        "deadline_seconds",
+        "cycle_concurrency",
+        "max_concurrency",
+        "rate_limit",
+        "pricing",
+        "circuit_open_action",
+        "timeout_seconds",
+    }
+)
+
+
+def canonical_fetch_input(engine: str, model: str, fetch_input: Dict[str, Any]) -> Dict[str, Any]:
+    cfg = {k: v for k, v in (fetch_input.get("config") or {}).items() if k not in NON_SEMANTIC_CONFIG_KEYS}
+    return {
+        "engine": engine,
+        "model": model,
+        "query": (fetch_input.get("query") or "").strip(),
+        "language": fetch_input.get("language"),
+        "region": fetch_input.get("region"),
+        "device": fetch_input.get("device"),
+        "config": cfg,
+    }
+
+
+def fetch_hash(engine: str, model: str, fetch_input: Dict[str, Any]) -> str:
+    """Hash canônico do fetch_input efetivo (mesmo valor gravado em Run.config_hash)."""
+    payload = json.dumps(
+        canonical_fetch_input(engine, model, fetch_input),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ttl_for(engine: str, cfg: Dict[str, Any] | None) -> int:
+    """TTL efetivo: config_json["cache_ttl_seconds"] > settings.response_cache_ttl[engine] > default. 0 = sem cache."""
+    cfg = cfg or {}
+    if not settings.response_cache_enabled or cfg.get("cache") is False:
+        return 0
+    value = cfg.get("cache_ttl_seconds")
+    if value is None:
+        value = settings.response_cache_ttl.get(engine, settings.response_cache_ttl_default)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _cache_key(engine: str, digest: str) -> str:
+    return key("rc", engine, digest)
+
+
+def _redis():
+    # instância/DB dedicada ao cache (descartável sob pressão de memória), separada do broker
+    return get_async_redis(settings.response_cache_redis_url)
+
+
+def pack(raw: Dict[str, Any], parsed: Dict[str, Any], citations: List[Dict[str, Any]]) -> bytes:
+    """Serializa um resultado de engine (JSON + zlib) para guardar no Redis."""
+    return zlib.compress(
+        json.dumps(
+            {"raw": raw, "parsed": parsed, "citations": citations, "stored_at": time.time()},
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8"),
+        6,
+    )
+
+
+def unpack(blob: bytes) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], float]:
+    """(raw, parsed, citations, idade em segundos) de um blob gerado por `pack`."""
+    entry = json.loads(zlib.decompress(blob))
+    return entry["raw"], entry["parsed"], entry["citations"], max(0.0, time.time() - float(entry.get("stored_at") or 0))
+
+
+async def get(engine: str, digest: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], float]]:
+    """(raw, parsed, citations, idade em segundos) do cache, ou None."""
+    try:
+        blob = await _redis().get(_cache_key(engine, digest))
+    except Exception:
+        return None
+    if not blob:
+        return None
+    try:
+        return unpack(blob)
+    except Exception:
+        return None
+
+
+async def put(
+    engine: str,
+    digest: str,
+    ttl: int,
+    raw: Dict[str, Any],
+    parsed: Dict[str, Any],
+    citations: List[Dict[str, Any]],
+) -> bool:
+    if ttl <= 0:
+        return False
+    try:
+        blob = pack(raw, parsed, citations)
+        # respostas muito grandes não compensam ocupar memória do Redis
+        if len(blob) > settings.response_cache_max_entry_bytes:
+            return False
+        await _redis().set(_cache_key(engine, digest), blob, ex=ttl)
+        return True
+    except Exception:
+        return False
+
+
+def mark_hit(parsed: Dict[str, Any], digest: str, age_seconds: float) -> Dict[str, Any]:
+    """Cópia do parsed com `meta.cache` indicando que a resposta veio do cache."""
+    meta = dict(parsed.get("meta") or {})
+    meta["cache"] = {"hit": True, "key": digest[:16], "age_seconds": int(age_seconds)}
+    return {**parsed, "meta": meta}
+
+
+def is_hit(parsed: Dict[str, Any] | None) -> bool:
+    return bool((((parsed or {}).get("meta") or {}).get("cache") or {}).get("hit"))
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis, key
+
+
+T = TypeVar("T")
+
+CANCEL_TTL_SECONDS = 24 * 3600
+CANCEL_POLL_SECONDS = 1.0
+
+
+class RunCancelled(Exception):
+    """Cancelamento solicitado via POST /runs/{id}/cancel."""
+
+    error_code = "cancelled"
+
+
+class RunDeadlineExceeded(TimeoutError):
+    """A run passou do prazo total (run_deadline_seconds / config_json["deadline_seconds"])."""
+
+    error_code = "deadline_exceeded"
+
+
+def _cancel_key(run_id: str) -> str:
+    return key("cancel", run_id)
+
+
+def deadline_seconds(engine: str, cfg: Dict[str, Any] | None) -> float:
+    """Prazo total da run: config_json["deadline_seconds"] > settings.run_deadlines[engine] > run_deadline_seconds."""
+    value = (cfg or {}).get("deadline_seconds")
+    if value is None:
+        value = settings.run_deadlines.get(engine, settings.run_deadline_seconds)
+    try:
+        return max(1.0, float(value))
+    except (TypeError, ValueError):
+        return float(settings.run_deadline_seconds)
+
+
+def start_deadline(fetch_input: Dict[str, Any]) -> None:
+    """Inicia o relógio do prazo (idempotente): fetch_input["deadline"] = agora + deadline_seconds."""
+    if fetch_input.get("deadline") is None and fetch_input.get("deadline_seconds"):
+        fetch_input["deadline"] = time.time() + float(fetch_input["deadline_seconds"])
+
+
+def remaining(fetch_input: Dict[str, Any] | None) -> Optional[float]:
+    """Segundos até o prazo da run propagado no fetch_input (None = sem prazo)."""
+    deadline = (fetch_input or {}).get("deadline")
+    if deadline is None:
+        return None
+    return max(0.0, float(deadline) - time.time())
+
+
+def request_cancel(run_id: str) -> bool:
+    try:
+        get_redis().set(_cancel_key(run_id), "1", ex=CANCEL_TTL_SECONDS)
+        return True
+    except Exception:
+        return False
+
+
+def is_cancelled(run_id: str) -> bool:
+    try:
+        return bool(get_redis().exists(_cancel_key(run_id)))
+    except Exception:
+        return False
+
+
+async def _watch_cancel(run_id: str) -> None:
+    while True:
+        try:
+            if await get_async_redis().exists(_cancel_key(run_id)):
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+
+
+def check(run_id: str | None, fetch_input: Dict[str, Any] | None = None) -> None:
+    """Checagem síncrona entre etapas do worker: levanta se a run foi cancelada ou estourou o prazo."""
+    if run_id and is_cancelled(run_id):
+        raise RunCancelled("Run cancelada pelo usuário")
+    left = remaining(fetch_input)
+    if left is not None and left <= 0:
+        raise RunDeadlineExceeded("Prazo da run esgotado")
+
+
+async def guard(coro: Awaitable[T], fetch_input: Dict[str, Any]) -> T:
+    """Executa `coro` respeitando o prazo da run e o pedido de cancelamento (cooperativo).
+
+    O fetch em andamento é cancelado (CancelledError propagado até o adapter/SDK) quando
+    o prazo acaba ou quando o flag de cancelamento aparece no Redis.
+    """
+    left = remaining(fetch_input)
+    if left is not None and left <= 0:
+        if asyncio.iscoroutine(coro):
+            coro.close()
+        raise RunDeadlineExceeded("Prazo da run esgotado")
+    run_id = fetch_input.get("run_id")
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_watch_cancel(run_id)) if run_id else None
+    try:
+        waiting = {work} | ({watcher} if watcher else set())
+        done, _ = await asyncio.wait(waiting, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+        if work in done:
+            return work.result()
+        if watcher is not None and watcher in done:
+            raise RunCancelled("Run cancelada pelo usuário")
+        raise RunDeadlineExceeded(f"Prazo da run esgotado ({int(left or 0)}s)")
+    finally:
+        for fut in (work, watcher):
+            if fut is not None and not fut.done():
+                fut.cancel()
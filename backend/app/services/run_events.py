@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.session import engine as db_engine
+from app.models.models import RunEvent, gen_id
+
+
+class RunEventBuffer:
+    """Acumula RunEvents do processo e grava em lote (um INSERT multi-linha por flush).
+
+    id e created_at são gerados no cliente, no momento do evento, para que a ordem vista
+    pelo stream SSE (`created_at > último visto`) seja a mesma de antes. O flush acontece
+    quando o buffer passa de `run_events_flush_seconds` ou `run_events_max_buffer`, e
+    explicitamente nas fronteiras de etapa (antes do fetch, ao concluir/falhar a run).
+    A escrita usa uma conexão própria, independente da transação da sessão da task.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._oldest = 0.0
+
+    def add(self, run_id: str, step: str, status: str, message: str | None = None) -> None:
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(
+                {
+                    "id": gen_id("evt"),
+                    "run_id": run_id,
+                    "step": step,
+                    "status": status,
+                    "message": message,
+                    "created_at": datetime.utcnow(),
+                }
+            )
+            due = (
+                len(self._rows) >= settings.run_events_max_buffer
+                or time.monotonic() - self._oldest >= settings.run_events_flush_seconds
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            with db_engine.begin() as conn:
+                conn.execute(insert(RunEvent), rows)
+        except Exception:
+            # ex.: run removida durante a execução (FK) – grava o que for possível, run a run
+            by_run: Dict[str, List[Dict[str, Any]]] = {}
+            for row in rows:
+                by_run.setdefault(row["run_id"], []).append(row)
+            for group in by_run.values():
+                try:
+                    with db_engine.begin() as conn:
+                        conn.execute(insert(RunEvent), group)
+                except Exception:
+                    pass
+        return len(rows)
+
+
+buffer = RunEventBuffer()
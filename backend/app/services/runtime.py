@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import threading
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncRuntime:
+    """Event loop de longa duração executado em uma thread dedicada.
+
+    Cada processo (worker Celery prefork, processo solo ou API) mantém um único loop;
+    as tasks síncronas submetem corrotinas via `run()` e aguardam o resultado. Como o loop
+    não é recriado a cada ciclo, clientes async (HTTP, SDKs) e sessões TLS sobrevivem entre tasks.
+    """
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        # Após fork (Celery prefork) a thread do pai não existe no filho: recriar o loop
+        if self._loop is not None and self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return self._loop
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _serve() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=_serve, name="seo-async-runtime", daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            # hooks registrados no processo pai não valem para o loop novo
+            self._shutdown_hooks = []
+            return loop
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._ensure_started()
+
+    def is_running(self) -> bool:
+        return self._loop is not None and self._pid == os.getpid() and bool(self._thread and self._thread.is_alive())
+
+    def in_runtime_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine[Any, Any, T]):
+        """Agenda a corrotina no loop e retorna um concurrent.futures.Future."""
+        if self.in_runtime_thread():
+            raise RuntimeError("AsyncRuntime.submit chamado de dentro do próprio loop")
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Executa a corrotina no loop persistente e bloqueia até o resultado."""
+        fut = self.submit(coro)
+        try:
+            return fut.result(timeout=timeout)
+        except BaseException:
+            fut.cancel()
+            raise
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """Registra uma corrotina de limpeza (ex.: fechar clientes HTTP) executada no shutdown."""
+        self._ensure_started()
+        self._shutdown_hooks.append(hook)
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        loop, thread = self._loop, self._thread
+        if loop is None or thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+
+        async def _close() -> None:
+            for hook in reversed(self._shutdown_hooks):
+                try:
+                    await hook()
+                except Exception:
+                    pass
+            self._shutdown_hooks = []
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        self._loop, self._thread, self._pid = None, None, None
+
+
+runtime = AsyncRuntime()
+
+
+atexit.register(runtime.shutdown)
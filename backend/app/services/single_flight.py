@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis, key
+from app.services.response_cache import pack, unpack
+
+
+STATS_KEY = key("sf", "stats")
+POLL_INTERVAL_SECONDS = 0.25
+
+# Remove o lock só se ainda pertence a este líder (lease pode ter expirado e sido reassumido)
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+Result = Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]
+
+_inflight: Dict[Tuple[int, str], "asyncio.Future[Result]"] = {}
+_inflight_pid = os.getpid()
+_scripts: Dict[int, Any] = {}
+
+
+def _lock_key(engine: str, digest: str) -> str:
+    return key("sf", "lock", engine, digest)
+
+
+def _result_key(engine: str, digest: str) -> str:
+    return key("sf", "res", engine, digest)
+
+
+def enabled(cfg: Dict[str, Any] | None) -> bool:
+    return bool(settings.single_flight_enabled) and (cfg or {}).get("single_flight") is not False
+
+
+def mark_shared(parsed: Dict[str, Any], role: str) -> Dict[str, Any]:
+    meta = dict(parsed.get("meta") or {})
+    meta["single_flight"] = {"shared": True, "role": role}
+    return {**parsed, "meta": meta}
+
+
+def is_shared(parsed: Dict[str, Any] | None) -> bool:
+    return bool((((parsed or {}).get("meta") or {}).get("single_flight") or {}).get("shared"))
+
+
+async def _count(field: str) -> None:
+    try:
+        await get_async_redis().hincrby(STATS_KEY, field, 1)
+    except Exception:
+        pass
+
+
+async def _release(r: Any, lock_key: str, token: str) -> None:
+    script = _scripts.get(id(r))
+    if script is None:
+        script = r.register_script(_RELEASE_LUA)
+        _scripts[id(r)] = script
+    await script(keys=[lock_key], args=[token])
+
+
+async def _lead_or_follow(
+    engine: str, digest: str, fetch: Callable[[], Awaitable[Result]], is_ok: Callable[[Result], bool]
+) -> Result:
+    lock_key, result_key = _lock_key(engine, digest), _result_key(engine, digest)
+    token = uuid.uuid4().hex
+    try:
+        r = get_async_redis()
+    except Exception:
+        return await fetch()
+    deadline = time.monotonic() + settings.single_flight_wait_seconds
+    while True:
+        try:
+            leader = await r.set(lock_key, token, nx=True, px=int(settings.single_flight_lease_seconds * 1000))
+        except Exception:
+            # Redis indisponível: segue sem coalescer
+            return await fetch()
+        if leader:
+            await _count("leaders")
+            try:
+                result = await fetch()
+                if is_ok(result):
+                    await r.set(result_key, pack(*result), ex=settings.single_flight_result_ttl_seconds)
+                return result
+            finally:
+                try:
+                    await _release(r, lock_key, token)
+                except Exception:
+                    pass
+        # outro worker já está buscando: aguardar o resultado publicado
+        while time.monotonic() < deadline:
+            try:
+                blob = await r.get(result_key)
+                if blob:
+                    raw, parsed, citations, _age = unpack(blob)
+                    await _count("remote_hits")
+                    return raw, mark_shared(parsed, "follower"), citations
+                if not await r.exists(lock_key):
+                    # líder terminou sem resultado aproveitável (falha): tentar assumir
+                    break
+            except Exception:
+                return await fetch()
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        else:
+            await _count("timeouts")
+            return await fetch()
+
+
+async def do(
+    engine: str, digest: str, fetch: Callable[[], Awaitable[Result]], is_ok: Callable[[Result], bool]
+) -> Result:
+    """Executa `fetch` uma única vez para chamadas idênticas simultâneas (engine, digest).
+
+    No processo, chamadas concorrentes aguardam o mesmo Future; entre workers, o primeiro a
+    obter o lock no Redis busca e publica o resultado (só se `is_ok`) por alguns segundos,
+    e os demais fazem polling até o resultado aparecer, o lock sumir ou o tempo esgotar.
+    """
+    global _inflight, _inflight_pid
+    if _inflight_pid != os.getpid():
+        _inflight, _inflight_pid = {}, os.getpid()
+    local_key = (id(asyncio.get_running_loop()), f"{engine}:{digest}")
+    existing = _inflight.get(local_key)
+    if existing is not None:
+        try:
+            raw, parsed, citations = await asyncio.shield(existing)
+        except asyncio.CancelledError:
+            if not existing.cancelled():
+                raise
+            # a chamada líder foi cancelada (não esta): buscar por conta própria
+            return await fetch()
+        await _count("local_hits")
+        return raw, mark_shared(parsed, "local"), citations
+    fut: "asyncio.Future[Result]" = asyncio.get_running_loop().create_future()
+    _inflight[local_key] = fut
+    try:
+        result = await _lead_or_follow(engine, digest, fetch, is_ok)
+        fut.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except BaseException as e:
+        fut.set_exception(e)
+        # evita "exception was never retrieved" quando ninguém aguardava
+        fut.exception()
+        raise
+    finally:
+        _inflight.pop(local_key, None)
+
+
+def collect_single_flight_stats() -> Dict[str, int]:
+    """Contadores globais: leaders (buscas reais), local_hits/remote_hits (chamadas coalescidas), timeouts."""
+    try:
+        data = get_redis().hgetall(STATS_KEY) or {}
+        return {k.decode(): int(v) for k, v in data.items()}
+    except Exception:
+        return {}
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
 import json
 import time
 from typing import Any
 
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_shutdown
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 
 from app.core.config import settings
 from app.db.session import SessionLocal
-from app.models.models import Run, Evidence, Citation, Domain, Engine, RunEvent, Insight
+from app.db.query_stats import QueryCounter, count_queries
+from app.models.models import Run, Citation, Domain, Engine, Project, PromptVersion
 from app.services.insights import generate_basic_insights
 from app.services.kpis import compute_run_report
-from app.services.normalization import normalize_domain
-from app.services.engine_runner import run_engine
+from app.services import domain_matcher
+from app.services.persistence import bulk_insert_citations, bulk_insert_evidences, citation_rows, evidence_row
+from app.services.mentions import build_terms, mention_citations, scanner_for
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.response_cache import is_hit as is_cache_hit
+from app.services.single_flight import is_shared as is_single_flight_shared
+from app.services.hedging import extra_requests
+from app.services import run_control
+from app.services.run_control import RunCancelled
+from app.services.engine_runner import EngineSlots, batch_wait_timeout, canonical_engine_name, fetch_cache_key, run_engine, run_engine_cycles, submit_engine_cycles
+from app.services.runtime import runtime
+from app.services.run_events import buffer as run_events
 from app.services.costs import compute_cost_usd, estimate_usage_from_text, get_default_pricing
 
 celery = Celery(
@@ -23,212 +35,597 @@ celery = Celery(
     broker=settings.redis_url,
     backend=settings.redis_url,
 )
+# tasks longas: cada processo reserva uma por vez, para que uma run interativa que chega
+# não fique presa atrás de runs de lote já reservadas pelo mesmo worker
+celery.conf.worker_prefetch_multiplier = 1
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _shutdown_runtime(**_kwargs: Any) -> None:
+    # Fecha clientes async e para o loop persistente do processo do worker
+    runtime.shutdown()
 
 
 def _log(db: Session, run_id: str, step: str, status: str, message: str | None = None) -> None:
-    db.add(RunEvent(run_id=run_id, step=step, status=status, message=message))
+    # bufferizado: gravado em lote por run_events (ver _flush_events nas fronteiras de etapa)
+    run_events.add(run_id, step, status, message)
+
+
+def _flush_events() -> None:
+    run_events.flush()
+
+
+def _engine_key(name: str) -> str:
+    try:
+        return canonical_engine_name(name)
+    except ValueError:
+        return (name or "").lower()
+
+
+def _cycle_concurrency(cfg: dict, total_cycles: int) -> int:
+    try:
+        value = int(cfg.get("cycle_concurrency") or settings.run_cycle_concurrency or 1)
+    except (TypeError, ValueError):
+        value = 1
+    return max(1, min(value, total_cycles))
+
+
+def _cycle_rows(
+    db: Session,
+    ctx: dict[str, Any],
+    raw: dict[str, Any],
+    parsed: dict[str, Any],
+    extracted: list[dict[str, Any]],
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """Monta as linhas de evidência e citações de um ciclo, registrando os RunEvents de cada etapa."""
+    run = ctx["run"]
+    if is_cache_hit(parsed):
+        ctx["cache_hits"] += 1
+        cache_meta = parsed["meta"]["cache"]
+        _log(db, run.id, "cache", "hit", f"{ctx['engine'].name}: resposta reutilizada ({cache_meta.get('age_seconds')}s, {cache_meta.get('key')})")
+    elif is_single_flight_shared(parsed):
+        ctx["single_flight_hits"] += 1
+        _log(db, run.id, "single_flight", "shared", f"{ctx['engine'].name}: resposta compartilhada de uma chamada idêntica em andamento")
+    elif extra_requests(parsed):
+        hedge = parsed["meta"]["hedge"]
+        _log(db, run.id, "hedge", "fired", f"pedido duplicado após {hedge.get('delay_ms')}ms; vencedor: {hedge.get('winner') or '-'}")
+
+    # custo somado por ciclo: ciclos servidos do cache/single-flight não chamaram o provider
+    if is_cache_hit(parsed) or is_single_flight_shared(parsed):
+        cycle_cost = 0.0
+    else:
+        cycle_cost = _cycle_cost(ctx["engine"], parsed)
+        # hedge: o pedido duplicado (cancelado ou perdedor) também é cobrado pelo provider
+        if cycle_cost is not None:
+            cycle_cost *= 1 + extra_requests(parsed)
+    if cycle_cost is not None:
+        ctx["cost_usd"] = (ctx["cost_usd"] or 0.0) + cycle_cost
+
+    # stream simples do texto (chunk)
+    if parsed.get("text"):
+        _log(db, run.id, "chunk", "ok", (parsed.get("text") or "")[:4000])
+
+    _log(db, run.id, "persist", "started")
+    ev_row = evidence_row(run.id, raw, parsed)
+    _log(db, run.id, "persist", "ok")
+
+    # extract citations (normalização de domínio e is_ours em uma única passada)
+    _log(db, run.id, "extract", "started")
+    # menções textuais (nome e domínios do projeto); gravadas como citações, mas fora das
+    # contagens de citações/domínios da run, que continuam medindo só os links
+    terms = build_terms(ctx["project_name"], (d.domain for d in ctx["domains"]))
+    ctx["aggregated_extracted"].extend(extracted)
+    extracted = [*extracted, *mention_citations(parsed.get("text") or "", scanner_for(terms))]
+    rows = citation_rows(run.id, extracted, ctx["matcher"])
+    ctx["citation_domains"].extend(r["domain"] for r in rows if r["type"] != "mention")
+    ctx["citation_rows"].extend(rows)
+    _log(db, run.id, "extract", "ok")
+    return ev_row, rows
+
+
+def _cycle_usage(parsed: dict[str, Any]) -> Any:
+    meta = parsed.get("meta") or {}
+    return meta.get("raw_usage") or meta.get("usage") or estimate_usage_from_text(parsed.get("text"))
+
+
+def _cycle_cost(engine: Engine, parsed: dict[str, Any]) -> float | None:
+    """Custo de uma chamada ao provider (pricing do config_json ou default por engine/modelo)."""
+    try:
+        meta = parsed.get("meta") or {}
+        usage = _cycle_usage(parsed)
+        model_name = (engine.config_json or {}).get("model") or meta.get("model") or meta.get("engine") or engine.name
+        base_cfg = dict(engine.config_json or {})
+        default_pricing_cfg = get_default_pricing(engine.name, str(model_name or "")) or {}
+        # merge raso: se usuário definiu pricing em config_json, mantém; senão aplica default
+        if default_pricing_cfg and not base_cfg.get("pricing"):
+            base_cfg.update(default_pricing_cfg)
+        return compute_cost_usd(base_cfg, usage if isinstance(usage, dict) else None)
+    except Exception:
+        return None
+
+
+def _write_rows(db: Session, evidences: list[dict[str, Any]], citations: list[dict[str, Any]]) -> None:
+    """Grava evidências e citações com INSERTs multi-valores em uma única transação."""
+    bulk_insert_evidences(db, evidences)
+    bulk_insert_citations(db, citations)
     db.commit()
 
 
-def enqueue_run(run_id: str, cycles: int = 1) -> None:
-    celery.send_task("tasks.execute_run", args=[run_id, cycles], queue="runs")
+def _persist_cycle(
+    db: Session,
+    ctx: dict[str, Any],
+    raw: dict[str, Any],
+    parsed: dict[str, Any],
+    extracted: list[dict[str, Any]],
+) -> None:
+    """Persiste evidência e citações de um ciclo."""
+    ev_row, rows = _cycle_rows(db, ctx, raw, parsed, extracted)
+    _write_rows(db, [ev_row], rows)
 
 
-@celery.task(name="tasks.execute_run")
-def execute_run(run_id: str, cycles: int = 1) -> None:
-    db: Session = SessionLocal()
+def queue_for(priority: str) -> str:
+    """Fila Celery da classe de prioridade (interactive → queue_interactive, batch → queue_batch)."""
+    return settings.queue_batch if priority == PRIORITY_BATCH else settings.queue_interactive
+
+
+def enqueue_run(run_id: str, cycles: int = 1, priority: str = PRIORITY_INTERACTIVE) -> None:
+    # task_id = id da run: permite revogar a task em POST /runs/{id}/cancel
+    celery.send_task(
+        "tasks.execute_run", args=[run_id, cycles], kwargs={"priority": priority}, queue=queue_for(priority), task_id=run_id
+    )
+
+
+def enqueue_batch(run_ids: list[str], cycles: int = 1, priority: str = PRIORITY_INTERACTIVE) -> str:
+    """Enfileira várias runs em uma única task executada com concorrência limitada por engine."""
+    result = celery.send_task(
+        "tasks.execute_batch", args=[list(run_ids), cycles], kwargs={"priority": priority}, queue=queue_for(priority)
+    )
+    return result.id
+
+
+def _start_run(
+    db: Session,
+    run_id: str,
+    cycles: int,
+    label: str | None = None,
+    counter: QueryCounter | None = None,
+    priority: str = PRIORITY_INTERACTIVE,
+    start_deadline: bool = True,
+) -> dict[str, Any] | None:
+    """Marca a run como em execução e monta o contexto (engine, fetch_input, domínios) para os ciclos."""
+    # Run + Engine + texto do prompt + nome e domínios do projeto em uma única consulta
+    rows = (
+        db.query(Run, Engine, PromptVersion.text, Domain, Project.name)
+        .join(Engine, Engine.id == Run.engine_id)
+        .join(Project, Project.id == Run.project_id)
+        .outerjoin(PromptVersion, PromptVersion.id == Run.prompt_version_id)
+        .outerjoin(Domain, Domain.project_id == Run.project_id)
+        .filter(Run.id == run_id)
+        .all()
+    )
+    if not rows:
+        return None
+    run, engine, prompt_text = rows[0][0], rows[0][1], rows[0][2] or ""
+    domains = [row[3] for row in rows if row[3] is not None]
+    if run.status == "cancelled":
+        return None
+    if run_control.is_cancelled(run.id):
+        _cancel_run(db, run.id)
+        return None
+    fetch_input = {
+        "query": prompt_text,
+        "language": "pt-BR",
+        "region": engine.region or "BR",
+        "device": engine.device or "desktop",
+        "config": engine.config_json or {},
+        # classe de prioridade (hedge só vale para runs interativas)
+        "priority": priority,
+        # prazo total da run e id para cancelamento cooperativo, propagados aos adapters
+        "run_id": run.id,
+        "deadline_seconds": run_control.deadline_seconds(_engine_key(engine.name), engine.config_json or {}),
+    }
+    # no lote o relógio só começa quando a run consegue o slot da engine (engine_runner._run_cycles)
+    if start_deadline:
+        run_control.start_deadline(fetch_input)
+
+    run.status = "running"
+    run.started_at = datetime.utcnow()
+    # hash canônico do fetch efetivo (também a chave do cache de respostas)
     try:
-        run = db.get(Run, run_id)
-        if not run:
-            return
-        run.status = "running"
-        run.started_at = datetime.utcnow()
-        db.commit()
-        _log(db, run.id, "queued", "ok", "Run started")
-
-        engine = db.get(Engine, run.engine_id)
-        query_text = db.execute(
-            text(
-                """
-                SELECT pv.text, p.variables_json
-                FROM prompt_versions pv
-                JOIN prompts p ON pv.prompt_id = p.id
-                WHERE pv.id = :pvid
-                """
-            ),
-            {"pvid": run.prompt_version_id},
-        ).mappings().first()
-        prompt_text = query_text["text"] if query_text else ""
-
-        fetch_input = {
-            "query": prompt_text,
-            "language": "pt-BR",
-            "region": engine.region or "BR",
-            "device": engine.device or "desktop",
-            "config": engine.config_json or {},
-        }
+        run.config_hash = fetch_cache_key(engine.name, fetch_input)
+    except Exception:
+        pass
+    db.commit()
+    _log(db, run.id, "queued", "ok", f"Run started ({label})" if label else "Run started")
 
-        # Logar opções efetivas usadas no fetch para auditoria/debug
-        try:
-            cfg = (engine.config_json or {})
-
-            # Calcular web_search efetivo respeitando defaults por engine
-            def compute_effective_web_search(engine_name: str, cfg_dict: dict) -> bool:
-                name = (engine_name or "").lower()
-                if name == "gemini":
-                    # Gemini: default é True, a não ser que use_search === False
-                    if "use_search" in cfg_dict:
-                        return bool(cfg_dict.get("use_search"))
-                    if "web_search" in cfg_dict:
-                        return bool(cfg_dict.get("web_search"))
-                    return True
-                # Demais engines: considerar apenas web_search explícito (default False)
+    # Logar opções efetivas usadas no fetch para auditoria/debug
+    try:
+        cfg = (engine.config_json or {})
+
+        # Calcular web_search efetivo respeitando defaults por engine
+        def compute_effective_web_search(engine_name: str, cfg_dict: dict) -> bool:
+            name = (engine_name or "").lower()
+            if name == "gemini":
+                # Gemini: default é True, a não ser que use_search === False
+                if "use_search" in cfg_dict:
+                    return bool(cfg_dict.get("use_search"))
                 if "web_search" in cfg_dict:
                     return bool(cfg_dict.get("web_search"))
-                return False
-
-            cfg_used = {
-                "model": cfg.get("model"),
-                # Mantém compatibilidade, mas agora reflete o default correto por engine
-                "web_search": compute_effective_web_search(engine.name, cfg),
-                # Reporta também o campo específico do Gemini quando presente
-                "use_search": cfg.get("use_search"),
-                "search_context_size": cfg.get("search_context_size"),
-                "reasoning_effort": cfg.get("reasoning_effort"),
-                "max_output_tokens": cfg.get("max_output_tokens"),
-                "web_search_force": cfg.get("web_search_force"),
-                "user_location": cfg.get("user_location"),
-            }
-            _log(db, run.id, "opts", "ok", json.dumps(cfg_used, ensure_ascii=False)[:4000])
-        except Exception:
-            pass
+                return True
+            # Demais engines: considerar apenas web_search explícito (default False)
+            if "web_search" in cfg_dict:
+                return bool(cfg_dict.get("web_search"))
+            return False
 
-        total_cycles = max(1, int(cycles or 1))
-        aggregated_extracted: list[dict[str, Any]] = []
-        project_domains = {normalize_domain(d.domain) for d in db.query(Domain).filter(Domain.project_id == run.project_id).all()}
-        t0_all = time.perf_counter()
-        last_raw: dict[str, Any] | None = None
-        last_parsed: dict[str, Any] | None = None
-        for i in range(total_cycles):
-            _log(db, run.id, "fetch", "started", f"Engine: {engine.name} (cycle {i+1}/{total_cycles})")
-            raw, parsed, extracted = run_engine(engine.name, fetch_input)
-            _log(db, run.id, "fetch", "ok")
-
-            last_raw, last_parsed = raw, parsed
-
-            # stream simples do texto (chunk)
-            if parsed.get("text"):
-                _log(db, run.id, "chunk", "ok", (parsed.get("text") or "")[:4000])
-
-            # persist evidence
-            _log(db, run.id, "persist", "started")
-            ev = Evidence(
-                run_id=run.id,
-                raw_url=raw.get("raw_url"),
-                parsed_json={
-                    "raw": raw.get("raw"),
-                    "parsed": {"text": parsed.get("text"), "links": parsed.get("links"), "meta": parsed.get("meta")},
-                },
-                screenshot_url=None,
-                content_hash=None,
-            )
-            db.add(ev)
-            db.commit()
-            _log(db, run.id, "persist", "ok")
-
-            # extract citations
-            _log(db, run.id, "extract", "started")
-            for c in extracted:
-                aggregated_extracted.append(c)
-                domain_norm = normalize_domain(c.get("url") or c.get("domain") or "")
-                is_ours = domain_norm in project_domains
-                db.add(
-                    Citation(
-                        run_id=run.id,
-                        domain=domain_norm,
-                        url=c.get("url"),
-                        anchor=c.get("anchor"),
-                        position=c.get("position"),
-                        type=c.get("type"),
-                        is_ours=is_ours,
-                    )
-                )
-            db.commit()
-            _log(db, run.id, "extract", "ok")
+        cfg_used = {
+            "model": cfg.get("model"),
+            # Mantém compatibilidade, mas agora reflete o default correto por engine
+            "web_search": compute_effective_web_search(engine.name, cfg),
+            # Reporta também o campo específico do Gemini quando presente
+            "use_search": cfg.get("use_search"),
+            "search_context_size": cfg.get("search_context_size"),
+            "reasoning_effort": cfg.get("reasoning_effort"),
+            "max_output_tokens": cfg.get("max_output_tokens"),
+            "web_search_force": cfg.get("web_search_force"),
+            "user_location": cfg.get("user_location"),
+            "cycle_concurrency": cfg.get("cycle_concurrency"),
+            "hedge": cfg.get("hedge"),
+        }
+        _log(db, run.id, "opts", "ok", json.dumps(cfg_used, ensure_ascii=False)[:4000])
+    except Exception:
+        pass
 
-        t1_all = time.perf_counter()
+    total_cycles = max(1, int(cycles or 1))
+    return {
+        "run": run,
+        "engine": engine,
+        "fetch_input": fetch_input,
+        "total_cycles": total_cycles,
+        "cycle_concurrency": _cycle_concurrency(engine.config_json or {}, total_cycles),
+        "domains": domains,
+        "project_name": rows[0][4],
+        "matcher": domain_matcher.for_rows(run.project_id, domains),
+        "aggregated_extracted": [],
+        "citation_domains": [],
+        "citation_rows": [],
+        "sql": counter or QueryCounter(),
+        "cache_hits": 0,
+        "single_flight_hits": 0,
+        "cost_usd": None,
+        "priority": priority,
+        "last_raw": None,
+        "last_parsed": None,
+    }
 
-        # métricas finais
-        try:
-            meta = (last_parsed or {}).get("meta") if last_parsed else {}
-            usage = (meta or {}).get("raw_usage") or (meta or {}).get("usage")
-            if not usage:
-                usage = estimate_usage_from_text((last_parsed or {}).get("text"))
-            tokens_input = None
-            tokens_output = None
-            tokens_total = None
-            # Definição do modelo usada (prioriza o configurado na Engine)
-            model_name = (engine.config_json or {}).get("model") or (meta or {}).get("model") or (meta or {}).get("engine") or engine.name
-            if isinstance(usage, dict):
-                # Preferir tokens faturáveis calculados por costs._extract_tokens (com desconto de cache)
-                from app.services.costs import _extract_tokens as _extract_tokens_internal
-                ti, to, tt = _extract_tokens_internal(usage)
-                tokens_input = ti
-                tokens_output = to
-                if tokens_input is not None and tokens_output is not None:
-                    tokens_total = int(tokens_input) + int(tokens_output)
-            if tokens_total is None and tokens_input is not None:
-                tokens_total = int(tokens_input) + int(tokens_output or 0)
-
-            citations_count = len(aggregated_extracted)
-            extracted_domains = [normalize_domain(c.get("url") or c.get("domain") or "") for c in aggregated_extracted]
-            our_citations_count = sum(1 for d in extracted_domains if d and d in project_domains)
-            unique_domains_count = len({d for d in extracted_domains if d})
-            # Pricing: mesclar defaults por (engine, model) com config_json
-            base_cfg = dict(engine.config_json or {})
-            default_pricing_cfg = get_default_pricing(engine.name, str(model_name or "")) or {}
-            # merge raso: se usuário definiu pricing em config_json, mantém; senão aplica default
-            if default_pricing_cfg and not base_cfg.get("pricing"):
-                base_cfg.update(default_pricing_cfg)
-            cost_usd = compute_cost_usd(base_cfg, usage if isinstance(usage, dict) else None)
-
-            run.tokens_input = int(tokens_input) if tokens_input is not None else None
-            run.tokens_output = int(tokens_output) if tokens_output is not None else None
-            run.tokens_total = int(tokens_total) if tokens_total is not None else None
-            run.model_name = str(model_name) if model_name else None
-            run.latency_ms = int((t1_all - t0_all) * 1000)
-            run.citations_count = citations_count
-            run.our_citations_count = our_citations_count
-            run.unique_domains_count = unique_domains_count
-            run.cost_usd = cost_usd
-        except Exception:
-            pass
 
-        # KPI (AMR/DCR/ZCRS) – calcular e persistir ao final da run para alimentar os painéis
-        try:
-            _ = compute_run_report(db, run.id)
-        except Exception:
-            pass
+def _log_fetch_started(db: Session, ctx: dict[str, Any]) -> None:
+    run, engine, total_cycles = ctx["run"], ctx["engine"], ctx["total_cycles"]
+    for i in range(total_cycles):
+        _log(db, run.id, "fetch", "started", f"Engine: {engine.name} (cycle {i+1}/{total_cycles}, concurrency {ctx['cycle_concurrency']})")
+    _flush_events()
 
-        run.status = "completed"
-        run.finished_at = datetime.utcnow()
-        try:
-            for ins in generate_basic_insights(db, run):
-                db.add(ins)
+
+def _persist_results(db: Session, ctx: dict[str, Any], results: list[Any]) -> None:
+    """Persiste, na ordem dos ciclos, os resultados buscados em paralelo."""
+    run, total_cycles = ctx["run"], ctx["total_cycles"]
+    first_error: BaseException | None = None
+    evidences: list[dict[str, Any]] = []
+    citations: list[dict[str, Any]] = []
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            first_error = first_error or result
+            _log(db, run.id, "fetch", "fail", f"cycle {i+1}/{total_cycles}: {result}"[:4000])
+            continue
+        raw, parsed, extracted = result
+        _log(db, run.id, "fetch", "ok", f"cycle {i+1}/{total_cycles}")
+        ctx["last_raw"], ctx["last_parsed"] = raw, parsed
+        ev_row, rows = _cycle_rows(db, ctx, raw, parsed, extracted)
+        evidences.append(ev_row)
+        citations.extend(rows)
+    # todos os ciclos em um único INSERT por tabela
+    if evidences:
+        _write_rows(db, evidences, citations)
+    # só falha a run se nenhum ciclo retornou
+    if ctx["last_parsed"] is None and first_error is not None:
+        raise first_error
+
+
+def _finish_run(db: Session, ctx: dict[str, Any], latency_ms: int) -> None:
+    """Calcula métricas finais, KPIs e insights e marca a run como concluída."""
+    run, engine = ctx["run"], ctx["engine"]
+    last_parsed = ctx["last_parsed"]
+    aggregated_extracted = ctx["aggregated_extracted"]
+    matcher = ctx["matcher"]
+
+    # métricas finais
+    try:
+        meta = (last_parsed or {}).get("meta") if last_parsed else {}
+        usage = _cycle_usage(last_parsed or {})
+        tokens_input = None
+        tokens_output = None
+        tokens_total = None
+        # Definição do modelo usada (prioriza o configurado na Engine)
+        model_name = (engine.config_json or {}).get("model") or (meta or {}).get("model") or (meta or {}).get("engine") or engine.name
+        if isinstance(usage, dict):
+            # Preferir tokens faturáveis calculados por costs._extract_tokens (com desconto de cache)
+            from app.services.costs import _extract_tokens as _extract_tokens_internal
+            ti, to, tt = _extract_tokens_internal(usage)
+            tokens_input = ti
+            tokens_output = to
+            if tokens_input is not None and tokens_output is not None:
+                tokens_total = int(tokens_input) + int(tokens_output)
+        if tokens_total is None and tokens_input is not None:
+            tokens_total = int(tokens_input) + int(tokens_output or 0)
+
+        citations_count = len(aggregated_extracted)
+        # domínios já normalizados na passada de persistência das citações
+        extracted_domains = ctx["citation_domains"]
+        our_citations_count = sum(1 for r in ctx["citation_rows"] if r["is_ours"] and r["type"] != "mention")
+        unique_domains_count = len({d for d in extracted_domains if d})
+        # custo acumulado por ciclo em _cycle_rows (inclui pedidos extras de hedge)
+        cost_usd = ctx["cost_usd"]
+
+        run.tokens_input = int(tokens_input) if tokens_input is not None else None
+        run.tokens_output = int(tokens_output) if tokens_output is not None else None
+        run.tokens_total = int(tokens_total) if tokens_total is not None else None
+        run.model_name = str(model_name) if model_name else None
+        run.latency_ms = latency_ms
+        run.citations_count = citations_count
+        run.our_citations_count = our_citations_count
+        run.unique_domains_count = unique_domains_count
+        run.cost_usd = cost_usd
+    except Exception:
+        pass
+
+    # KPI (AMR/DCR/ZCRS) e insights com os dados já em memória, na mesma transação da conclusão
+    try:
+        compute_run_report(
+            db,
+            run.id,
+            run=run,
+            citations=[Citation(**row) for row in ctx["citation_rows"]],
+            matcher=matcher,
+            commit=False,
+        )
+    except Exception:
+        pass
+
+    run.status = "completed"
+    run.finished_at = datetime.utcnow()
+    try:
+        insights = generate_basic_insights(
+            db,
+            run,
+            matcher=matcher,
+            citations=[Citation(**row) for row in ctx["citation_rows"]],
+        )
+        db.add_all(insights)
+    except Exception:
+        pass
+    # custo de banco da run até aqui (o commit final não entra na contagem)
+    run.cache_hits = ctx["cache_hits"]
+    run.single_flight_hits = ctx["single_flight_hits"]
+    run.sql_statements = ctx["sql"].statements
+    run.db_round_trips = ctx["sql"].round_trips
+    db.commit()
+    _log(db, run.id, "completed", "ok")
+    _flush_events()
+
+
+def _fail_run(db: Session, run_id: str, e: BaseException) -> None:
+    try:
+        db.rollback()
+    except Exception:
+        pass
+    _log(db, run_id, "error", "fail", str(e))
+    _flush_events()
+    try:
+        run = db.get(Run, run_id)
+        if run:
+            run.status = "failed"
+            run.error_code = getattr(e, "error_code", None) or run.error_code
+            run.finished_at = datetime.utcnow()
             db.commit()
-        except Exception:
-            pass
+    except Exception:
+        pass
+
+
+def _cancel_run(db: Session, run_id: str, e: BaseException | None = None) -> None:
+    """Encerra a run como cancelada (pedido via POST /runs/{id}/cancel)."""
+    try:
+        db.rollback()
+    except Exception:
+        pass
+    _log(db, run_id, "cancelled", "ok", str(e) if e else "Run cancelada antes de iniciar")
+    _flush_events()
+    try:
+        run = db.get(Run, run_id)
+        if run:
+            run.status = "cancelled"
+            run.error_code = RunCancelled.error_code
+            run.finished_at = datetime.utcnow()
+            db.commit()
+    except Exception:
+        pass
+
+
+def _circuit_open(
+    db: Session, run_id: str, cycles: int, e: CircuitOpenError, requeues: int, started: bool, priority: str = PRIORITY_INTERACTIVE
+) -> None:
+    """Breaker aberto para a engine/modelo da run: reenfileira com atraso ou falha com error_code=circuit_open.
+
+    Só reenfileira runs que ainda não persistiram nenhum ciclo (`started=False`), para não duplicar evidências.
+    """
+    try:
+        db.rollback()
+    except Exception:
+        pass
+    run = db.get(Run, run_id)
+    if not run:
+        return
+    engine = db.get(Engine, run.engine_id)
+    action = str(((engine.config_json if engine else None) or {}).get("circuit_open_action") or settings.circuit_breaker_action)
+    if action == "requeue" and not started and requeues < settings.circuit_breaker_max_requeues:
+        countdown = max(1, int(e.retry_after) + 1)
+        run.status = "queued"
+        run.started_at = None
         db.commit()
-        _log(db, run.id, "completed", "ok")
+        _log(db, run_id, "circuit", "requeued", f"{e} (reenfileirada em {countdown}s, tentativa {requeues+1}/{settings.circuit_breaker_max_requeues})")
+        _flush_events()
+        celery.send_task(
+            "tasks.execute_run",
+            args=[run_id, cycles],
+            kwargs={"requeues": requeues + 1, "priority": priority},
+            countdown=countdown,
+            queue=queue_for(priority),
+            task_id=run_id,
+        )
+        return
+    _log(db, run_id, "circuit", "fail", str(e))
+    _flush_events()
+    run.status = "failed"
+    run.error_code = e.error_code
+    run.finished_at = datetime.utcnow()
+    db.commit()
+
+
+@celery.task(name="tasks.execute_run")
+def execute_run(run_id: str, cycles: int = 1, requeues: int = 0, priority: str = PRIORITY_INTERACTIVE) -> None:
+    db: Session = SessionLocal()
+    counter = QueryCounter()
+    try:
+        with count_queries(counter):
+            _execute_run(db, run_id, cycles, counter, requeues, priority)
+    finally:
+        _flush_events()
+        db.close()
+
+
+def _execute_run(db: Session, run_id: str, cycles: int, counter: QueryCounter, requeues: int, priority: str) -> None:
+    ctx: dict[str, Any] | None = None
+    try:
+        ctx = _start_run(db, run_id, cycles, counter=counter, priority=priority)
+        if ctx is None:
+            return
+        run, engine, fetch_input = ctx["run"], ctx["engine"], ctx["fetch_input"]
+        total_cycles = ctx["total_cycles"]
+
+        if ctx["cycle_concurrency"] > 1:
+            # Modo concorrente: todos os ciclos são buscados juntos e persistidos na ordem
+            _log_fetch_started(db, ctx)
+            results, latency_ms = run_engine_cycles(engine.name, fetch_input, total_cycles, ctx["cycle_concurrency"])
+            run_control.check(run.id)
+            _persist_results(db, ctx, results)
+        else:
+            t0_all = time.perf_counter()
+            for i in range(total_cycles):
+                run_control.check(run.id, fetch_input)
+                _log(db, run.id, "fetch", "started", f"Engine: {engine.name} (cycle {i+1}/{total_cycles})")
+                _flush_events()
+                raw, parsed, extracted = run_engine(engine.name, fetch_input)
+                _log(db, run.id, "fetch", "ok")
+
+                ctx["last_raw"], ctx["last_parsed"] = raw, parsed
+                _persist_cycle(db, ctx, raw, parsed, extracted)
+            latency_ms = int((time.perf_counter() - t0_all) * 1000)
+
+        _finish_run(db, ctx, latency_ms)
+    except CircuitOpenError as e:
+        _circuit_open(db, run_id, cycles, e, requeues, started=bool(ctx and ctx["last_parsed"] is not None), priority=priority)
+    except RunCancelled as e:
+        _cancel_run(db, run_id, e)
     except Exception as e:
-        _log(db, run_id, "error", "fail", str(e))
+        _fail_run(db, run_id, e)
+
+
+@celery.task(name="tasks.execute_batch", bind=True)
+def execute_batch(self, run_ids: list[str], cycles: int = 1, priority: str = PRIORITY_INTERACTIVE) -> dict:
+    """Executa um lote de runs em um único executor async.
+
+    As chamadas de todas as runs são disparadas juntas no loop do worker, limitadas por engine
+    (`engine_concurrency_limit`), e cada run é persistida assim que seus ciclos terminam.
+    O progresso do lote é publicado no estado da task (PROGRESS: total/done/failed).
+    """
+    total = len(run_ids or [])
+    progress = {"total": total, "done": 0, "failed": 0}
+
+    def _report() -> None:
         try:
-            run = db.get(Run, run_id)
-            if run:
-                run.status = "failed"
-                run.finished_at = datetime.utcnow()
-                db.commit()
+            self.update_state(state="PROGRESS", meta=dict(progress))
         except Exception:
             pass
+
+    db: Session = SessionLocal()
+    slots = EngineSlots()
+    pending: dict[Any, dict[str, Any]] = {}
+    try:
+        for idx, run_id in enumerate(run_ids or []):
+            try:
+                counter = QueryCounter()
+                with count_queries(counter):
+                    ctx = _start_run(
+                        db,
+                        run_id,
+                        cycles,
+                        label=f"batch {self.request.id or '-'} {idx+1}/{total}",
+                        counter=counter,
+                        priority=priority,
+                        start_deadline=False,
+                    )
+                if ctx is None:
+                    progress["done"] += 1
+                    continue
+                _log_fetch_started(db, ctx)
+                fut = submit_engine_cycles(ctx["engine"].name, ctx["fetch_input"], ctx["total_cycles"], ctx["cycle_concurrency"], slots)
+                pending[fut] = ctx
+            except Exception as e:
+                _fail_run(db, run_id, e)
+                progress["done"] += 1
+                progress["failed"] += 1
+        _report()
+
+        while pending:
+            timeout = batch_wait_timeout(ctx["fetch_input"] for ctx in pending.values())
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # loop travado ou coroutine que nunca resolve: falha o restante e libera o worker
+                for fut, ctx in list(pending.items()):
+                    pending.pop(fut)
+                    fut.cancel()
+                    _fail_run(db, ctx["run"].id, TimeoutError(f"lote sem progresso em {timeout:.0f}s"))
+                    progress["done"] += 1
+                    progress["failed"] += 1
+                _report()
+                break
+            for fut in done:
+                ctx = pending.pop(fut)
+                run_id = ctx["run"].id
+                try:
+                    results, latency_ms = fut.result()
+                    run_control.check(run_id)
+                    with count_queries(ctx["sql"]):
+                        _persist_results(db, ctx, results)
+                        _finish_run(db, ctx, latency_ms)
+                except CircuitOpenError as e:
+                    _circuit_open(db, run_id, cycles, e, 0, started=ctx["last_parsed"] is not None, priority=priority)
+                    progress["failed"] += 1
+                except RunCancelled as e:
+                    _cancel_run(db, run_id, e)
+                    progress["failed"] += 1
+                except Exception as e:
+                    _fail_run(db, run_id, e)
+                    progress["failed"] += 1
+                progress["done"] += 1
+                _report()
+        return progress
     finally:
+        # runs não concluídas (ex.: worker encerrando) não ficam penduradas em "running"
+        for fut, ctx in pending.items():
+            fut.cancel()
+            _fail_run(db, ctx["run"].id, RuntimeError("batch interrompido"))
+        _flush_events()
         db.close()
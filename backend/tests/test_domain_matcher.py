@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("httpx")
+
+from app.services import domain_matcher  # noqa: E402
+from app.services.domain_matcher import DomainMatcher, pattern_error  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"(a+)+$",
+        r"(\w*\.)*example\.com",
+        r"(a|aa)+\.com$",
+        r"((a|b))+",
+        r"(a)(\1)+",
+        "x" * (domain_matcher.MAX_PATTERN_LENGTH + 1),
+        "(",
+    ],
+)
+def test_pattern_error_rejects_unsafe_patterns(pattern):
+    assert pattern_error(pattern)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [r"blog\.example\.com/.*", r"(www\.|blog\.)?example\.com", r"(a|b)c", r"(a{1}){3}"],
+)
+def test_pattern_error_accepts_safe_patterns(pattern):
+    assert pattern_error(pattern) is None
+
+
+def test_matcher_skips_overlapping_alternation():
+    matcher = DomainMatcher([("exemplo.com.br", r"(a|aa)+\.com$")])
+    assert matcher.invalid_patterns == [r"(a|aa)+\.com$"]
+    assert not matcher.matches("a" * 40 + ".co")
+    assert matcher.matches("https://blog.exemplo.com.br/artigo")